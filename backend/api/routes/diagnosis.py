@@ -3,16 +3,22 @@ import os
 import sys
 from werkzeug.utils import secure_filename
 import datetime
+import time
+import zipfile
+from contextlib import nullcontext
 
 # Cleanly add the project root to our python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from database.db_connection import db
 from config.settings import settings
-from utils.image_quality_check import check_image_quality, check_content_validity
+from utils.image_quality_check import check_image_quality, check_image_quality_batch, check_content_validity
+from utils.image_header import check_image_header
+from utils.decoded_image import DecodedImage
+from utils.upload_store import check_upload_header, decode_min_side, decode_upload, persist_upload_async, persist_bytes_async
 from utils.preprocess import preprocess_image
 from utils.validators import validate_diagnosis_request
-from services.language_service import translate_diagnosis_result, translate_disease_info, translate_pesticide_info, translate_text, get_translated_ui_labels
+from services.language_service import TranslationJob, translate_batch, translate_diagnosis_result, translate_disease_info, translate_pesticide_info, get_translated_ui_labels
 from services.voice_service import generate_diagnosis_voice
 from services.pesticide_service import get_severity_based_recommendations
 from services.cost_service import calculate_total_cost
@@ -22,49 +28,114 @@ from api.routes.user import verify_token
 
 # Ensure we can find the ML models
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'ml'))
-from final_predictor import full_prediction
+from final_predictor import CropNotIdentifiedError, full_prediction, full_prediction_batch, summarize_batch
+from crop_classifier import auto_crop_available
+from model_registry import model_registry
+from inference_scheduler import inference_scheduler
+from inference_client import InferenceServiceError, inference_client
+from prediction_cache import prediction_cache
 
 # Organize our diagnosis routes
 diagnosis_bp = Blueprint('diagnosis', __name__)
 
+# Explanation for each check_image_header rejection
+HEADER_REJECTION_DETAILS = {
+    'format': 'Only JPEG and PNG images are supported.',
+    'channels': 'Only JPEG and PNG images are supported.',
+    'dimensions': 'Image dimensions are invalid.',
+    'decompression_bomb': 'Image too large to decode. Please upload the original camera photo.'
+}
+
 def allowed_file(filename):
     """Check if the uploaded file has a valid extension (like .jpg or .png)"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in settings.ALLOWED_EXTENSIONS
 
+def get_request_user():
+    """
+    Work out who is asking and which language to answer in.
+    Returns (user_id or None, language).
+    """
+    user_id = None
+    language = 'en'
+    
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+        token_data = verify_token(token)
+        
+        if token_data['valid']:
+            user_id = token_data['user_id']
+            
+            # Use their preferred language if found
+            user = db.execute_query('SELECT preferred_language FROM users WHERE id = ?', (user_id,))
+            if user:
+                language = user[0]['preferred_language']
+    
+    # If the app explicitly sets a language (e.g., user switched it temporarily), use that
+    if 'language' in request.form and request.form['language']:
+        language = request.form['language']
+    
+    return user_id, language
+
+class BatchTooLargeError(ValueError):
+    """A batch request holds more images, or more image data, than allowed"""
+
+
+def collect_batch_uploads():
+    """
+    Gather (filename, bytes) pairs from a batch request: either several
+    'images' files or one 'archive' zip of images. Archive members larger
+    than MAX_CONTENT_LENGTH are not extracted and come back with bytes None.
+    
+    The image count (MAX_BATCH_IMAGES) and the archive's total uncompressed
+    size (MAX_ARCHIVE_EXTRACTED_SIZE) are checked from the zip directory
+    before anything is read; BatchTooLargeError if either is exceeded
+    """
+    files = [file for file in request.files.getlist('images') if file.filename and allowed_file(file.filename)]
+    
+    archive = request.files.get('archive')
+    with zipfile.ZipFile(archive.stream) if archive and archive.filename else nullcontext() as zf:
+        members = []
+        if zf is not None:
+            members = [info for info in zf.infolist()
+                       if not info.is_dir() and allowed_file(os.path.basename(info.filename))]
+        
+        if len(files) + len(members) > settings.MAX_BATCH_IMAGES:
+            raise BatchTooLargeError(f'Too many images (maximum {settings.MAX_BATCH_IMAGES} per batch)')
+        # Declared sizes bound what is read: zipfile stops a member at its file_size
+        extracted = sum(info.file_size for info in members if info.file_size <= settings.MAX_CONTENT_LENGTH)
+        if extracted > settings.MAX_ARCHIVE_EXTRACTED_SIZE:
+            raise BatchTooLargeError(
+                f'Archive too large when extracted (maximum {settings.MAX_ARCHIVE_EXTRACTED_SIZE // (1024 * 1024)}MB)'
+            )
+        
+        uploads = [(secure_filename(file.filename), file.read()) for file in files]
+        for info in members:
+            name = secure_filename(os.path.basename(info.filename))
+            if info.file_size > settings.MAX_CONTENT_LENGTH:
+                # Not extracted (zip bomb guard); reported as rejected
+                uploads.append((name, None))
+                continue
+            uploads.append((name, zf.read(info)))
+    
+    return uploads
+
 @diagnosis_bp.route('/detect', methods=['POST'])
 def detect_disease():
     """
     The main feature: Detect disease from an uploaded image!
     Users can be logged in or anonymous.
     """
+    started = time.perf_counter()
     try:
         
-        user_id = None
-        language = 'en'  
-        
         # Debugging prints to help us see what's coming in
         print(f"DEBUG: Request files: {request.files}")
         print(f"DEBUG: Request form: {request.form}")
         print(f"DEBUG: Request headers: {dict(request.headers)}")
         
-        # Check if the user is logged in
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            token_data = verify_token(token)
-            
-            if token_data['valid']:
-                user_id = token_data['user_id']
-                
-                # Use their preferred language if found
-                user = db.execute_query('SELECT preferred_language FROM users WHERE id = ?', (user_id,))
-                if user:
-                    language = user[0]['preferred_language']
-        
-        
-        # If the app explicitly sets a language (e.g., user switched it temporarily), use that
-        if 'language' in request.form and request.form['language']:
-            language = request.form['language']
+        # Check if the user is logged in (anonymous is fine)
+        user_id, language = get_request_user()
         
         
         # Make sure they actually sent an image
@@ -86,9 +157,13 @@ def detect_disease():
         # Identify the crop (e.g., tomato, rice)
         crop = request.form.get('crop', '').lower()
         print(f"DEBUG: Crop value: '{crop}'")
-        if not crop or crop not in ['grape', 'maize', 'potato', 'rice', 'tomato']:
+        if crop in ('', 'auto') and auto_crop_available():
+            # Auto-crop mode: the crop is identified from the image itself
+            crop = None
+        elif not crop or crop not in model_registry.crops():
+            # Crops come from the model manifest (config/model_manifest.json)
             print(f"DEBUG: Invalid crop: '{crop}'")
-            return jsonify({'error': 'Valid crop type required (tomato, cotton)'}), 400
+            return jsonify({'error': f"Valid crop type required ({', '.join(model_registry.crops())})"}), 400
         
         
         # Get location for weather-based advice (optional)
@@ -102,13 +177,33 @@ def detect_disease():
         user_prefix = f"{user_id}_" if user_id else "anonymous_"
         filename = f"{user_prefix}{timestamp}_{filename}"
         filepath = os.path.join(settings.UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        
+        # Format, dimensions and decompression bombs are checked from the
+        # header alone, so rejected uploads are never decoded (or saved)
+        header_result = check_upload_header(file)
+        if not header_result['is_valid']:
+            print(f"DEBUG: Header check failed: {header_result}")
+            return jsonify({
+                'error': 'Image Rejected',
+                'message': header_result.get('reason'),
+                'details': HEADER_REJECTION_DETAILS[header_result['rejection']]
+            }), 400
+        
+        # Decode once; every stage below shares this object
+        if settings.IN_MEMORY_UPLOADS:
+            # Straight from the request stream - only written to disk if a history row needs it
+            image = decode_upload(file)
+        else:
+            file.save(filepath)
+            image = DecodedImage.from_path(filepath, min_side=decode_min_side())
+        if image is not None:
+            print(f"DEBUG: Decoded {filename}: {image.width}x{image.height} {image.decode_stats}")
         
         
         # --- QUALITY CHECKS ---
         # First, is the image blurry or too dark?
         print(f"DEBUG: Checking image quality for: {filename}")
-        quality_result = check_image_quality(filepath)
+        quality_result = check_image_quality(image)
         print(f"DEBUG: Quality result: {quality_result}")
         
         quality_warning = None  
@@ -118,7 +213,7 @@ def detect_disease():
             
             # If dimensions are totally wrong, block it
             if 'dimensions' in quality_result and quality_result['quality_score'] == 0.0:
-                 if os.path.exists(filepath):
+                 if not settings.IN_MEMORY_UPLOADS and os.path.exists(filepath):
                     os.remove(filepath)
                  return jsonify({
                     'error': 'Image Rejected',
@@ -134,13 +229,13 @@ def detect_disease():
             # Translate error if needed
             if language != 'en':
                 try:
-                    error_msg = translate_text(error_msg, language)
-                    details_msg = translate_text(details_msg, language)
+                    messages = translate_batch({'error': error_msg, 'details': details_msg}, language)
+                    error_msg, details_msg = messages['error'], messages['details']
                 except:
                     pass
 
             
-            if os.path.exists(filepath):
+            if not settings.IN_MEMORY_UPLOADS and os.path.exists(filepath):
                 os.remove(filepath)
 
             return jsonify({
@@ -152,12 +247,12 @@ def detect_disease():
         
         # Second, does the image actually look like a leaf?
         print(f"DEBUG: Checking content validity for: {filename}")
-        content_result = check_content_validity(filepath)
+        content_result = check_content_validity(image)
         print(f"DEBUG: Content result: {content_result}")
         
         if not content_result['is_valid']:
             
-            if os.path.exists(filepath):
+            if not settings.IN_MEMORY_UPLOADS and os.path.exists(filepath):
                 os.remove(filepath)
             
             error_msg = content_result.get('reason')
@@ -165,8 +260,8 @@ def detect_disease():
             
             if language != 'en':
                 try:
-                    error_msg = translate_text(error_msg, language)
-                    details_msg = translate_text(details_msg, language)
+                    messages = translate_batch({'error': error_msg, 'details': details_msg}, language)
+                    error_msg, details_msg = messages['error'], messages['details']
                 except:
                     pass
             
@@ -179,7 +274,17 @@ def detect_disease():
         
         # --- AI PREDICTION ---
         print(f"DEBUG: Starting disease prediction for crop: {crop}")
-        prediction_result = full_prediction(filepath, crop)
+        try:
+            prediction_result = full_prediction(image, crop)
+        except CropNotIdentifiedError as e:
+            if not settings.IN_MEMORY_UPLOADS and os.path.exists(filepath):
+                os.remove(filepath)
+            return jsonify({
+                'error': 'Crop Not Identified',
+                'message': str(e),
+                'details': 'Please select the crop and try again.'
+            }), 400
+        crop = prediction_result['crop']
         print(f"DEBUG: Prediction result: {prediction_result}")
 
         
@@ -189,6 +294,10 @@ def detect_disease():
         
         
         # --- GATHER INFORMATION ---
+        # Everything below that needs translating is collected into one job
+        # and translated together just before the response is built
+        translation_job = TranslationJob(language)
+        
         # 1. Get detailed info about the disease from our database
         disease_data = {}
         try:
@@ -205,7 +314,7 @@ def detect_disease():
                 }
                 
                 # Translate it
-                disease_data = translate_disease_info(disease_data, language)
+                disease_data = translate_disease_info(disease_data, language, translation_job)
         except Exception as e:
             print(f"DEBUG: Error getting disease info: {e}")
             disease_data = {}
@@ -223,18 +332,11 @@ def detect_disease():
             
             # Translate recommendations if needed
             if language != 'en' and pesticide_recommendations:
-                if 'treatment_approach' in pesticide_recommendations:
-                    pesticide_recommendations['treatment_approach'] = translate_text(
-                        pesticide_recommendations['treatment_approach'], language
-                    )
-                if 'application_note' in pesticide_recommendations:
-                    pesticide_recommendations['application_note'] = translate_text(
-                        pesticide_recommendations['application_note'], language
-                    )
+                translation_job.add_fields(pesticide_recommendations, ('treatment_approach', 'application_note'))
                 
                 new_pests = []
                 for pest in pesticide_recommendations.get('recommended_pesticides', []):
-                    new_pests.append(translate_pesticide_info(pest, language))
+                    new_pests.append(translate_pesticide_info(pest, language, translation_job))
                 pesticide_recommendations['recommended_pesticides'] = new_pests
 
         except Exception as e:
@@ -258,6 +360,9 @@ def detect_disease():
         diagnosis_id = None
         try:
             if user_id:
+                if settings.IN_MEMORY_UPLOADS:
+                    persist_upload_async(file, filepath)
+                
                 diagnosis_id = db.execute_insert(
                     '''INSERT INTO diagnosis_history 
                        (user_id, crop, disease, confidence, severity_percent, stage, image_path, latitude, longitude)
@@ -298,7 +403,10 @@ def detect_disease():
         
         
         # Translate the prediction labels (like "Healthy" or "Early Blight")
-        translated_result = translate_diagnosis_result(prediction_result, language)
+        translated_result = translate_diagnosis_result(prediction_result, language, translation_job)
+        
+        # One round of (concurrent) network calls for every text above
+        translation_job.run()
         
         
         # Get UI text (buttons, labels)
@@ -320,17 +428,157 @@ def detect_disease():
             'image_quality': quality_result,
             'quality_warning': quality_warning,  
             'language': language,
-            'ui_translations': ui_labels
+            'ui_translations': ui_labels,
+            'timing': {
+                'decode': image.decode_stats,
+                'total_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
         }
         
         return jsonify(response), 200
         
+    except InferenceServiceError as e:
+        print(f"DEBUG: Inference service error in detect_disease: {e}")
+        return jsonify({'error': 'Diagnosis is temporarily unavailable. Please try again.'}), 503
     except Exception as e:
         print(f"CRITICAL ERROR in detect_disease: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@diagnosis_bp.route('/detect/batch', methods=['POST'])
+def detect_disease_batch():
+    """
+    Diagnose many leaf images of one crop in a single request (a field visit).
+    Accepts multiple 'images' files or an 'archive' zip. Returns a result per
+    image plus a field-level summary.
+    """
+    try:
+        user_id, language = get_request_user()
+        
+        crop = request.form.get('crop', '').lower()
+        if crop not in model_registry.crops():
+            return jsonify({'error': f"Valid crop type required ({', '.join(model_registry.crops())})"}), 400
+        
+        try:
+            uploads = collect_batch_uploads()
+        except zipfile.BadZipFile:
+            return jsonify({'error': 'Archive is not a valid zip file'}), 400
+        except BatchTooLargeError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not uploads:
+            return jsonify({'error': 'No image files provided'}), 400
+        
+        latitude = request.form.get('latitude', type=float)
+        longitude = request.form.get('longitude', type=float)
+        
+        
+        # --- QUALITY CHECKS ---
+        # Rejected images are reported individually instead of failing the batch
+        results = [None] * len(uploads)
+        accepted = []
+        quality_results = [None] * len(uploads)
+        decoded = {}
+        for i, (name, data) in enumerate(uploads):
+            # Header first: rejected images are never decoded
+            if data is None:
+                quality_results[i] = {'is_valid': False, 'reason': f'Image file too large (maximum {settings.MAX_CONTENT_LENGTH // (1024 * 1024)}MB)'}
+            else:
+                quality_results[i] = check_image_header(data)
+            if quality_results[i]['is_valid']:
+                decoded[i] = DecodedImage.from_bytes(data, source=name, min_side=decode_min_side())
+        
+        # Every decoded image's quality is scored in one batch
+        for i, quality_result in zip(decoded, check_image_quality_batch(list(decoded.values()))):
+            quality_results[i] = quality_result
+        
+        for i, quality_result in enumerate(quality_results):
+            if quality_result['is_valid']:
+                image = decoded[i]
+                content_result = check_content_validity(image)
+            else:
+                content_result = quality_result
+            
+            if not content_result['is_valid']:
+                results[i] = {
+                    'filename': uploads[i][0],
+                    'status': 'rejected',
+                    'reason': content_result.get('reason')
+                }
+                continue
+            
+            accepted.append((i, image))
+        
+        
+        # --- AI PREDICTION (one batched model call) ---
+        predictions = full_prediction_batch([image for _, image in accepted], crop)
+        for (i, image), prediction in zip(accepted, predictions):
+            results[i] = {
+                'filename': uploads[i][0],
+                'status': 'ok',
+                'prediction': prediction,
+                'timing': {'decode': image.decode_stats}
+            }
+        
+        
+        # --- SAVE HISTORY (single transaction) ---
+        if user_id and predictions:
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            with db.get_connection() as conn:
+                cursor = conn.cursor()
+                for (i, _), prediction in zip(accepted, predictions):
+                    filepath = os.path.join(
+                        settings.UPLOAD_FOLDER, f"{user_id}_{timestamp}_{i}_{uploads[i][0]}"
+                    )
+                    cursor.execute(
+                        '''INSERT INTO diagnosis_history 
+                           (user_id, crop, disease, confidence, severity_percent, stage, image_path, latitude, longitude)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                        (
+                            user_id,
+                            crop,
+                            prediction['disease'],
+                            float(prediction['confidence']),
+                            float(prediction['severity_percent']),
+                            prediction['stage'],
+                            filepath,
+                            latitude,
+                            longitude
+                        )
+                    )
+                    results[i]['diagnosis_id'] = cursor.lastrowid
+                    persist_bytes_async(uploads[i][1], filepath)
+        
+        
+        # Translate the labels for each diagnosed image
+        if language != 'en':
+            translation_job = TranslationJob(language)
+            for result in results:
+                if result['status'] == 'ok':
+                    result['prediction'] = translate_diagnosis_result(result['prediction'], language, translation_job)
+            translation_job.run()
+        
+        summary = summarize_batch(predictions)
+        summary['images_received'] = len(uploads)
+        summary['images_rejected'] = len(uploads) - len(predictions)
+        
+        return jsonify({
+            'crop': crop,
+            'results': results,
+            'summary': summary,
+            'language': language
+        }), 200
+        
+    except InferenceServiceError as e:
+        print(f"DEBUG: Inference service error in detect_disease_batch: {e}")
+        return jsonify({'error': 'Diagnosis is temporarily unavailable. Please try again.'}), 503
+    except Exception as e:
+        print(f"CRITICAL ERROR in detect_disease_batch: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @diagnosis_bp.route('/history', methods=['GET'])
 def get_history():
     """Get the user's past diagnoses (so they can track progress)"""
@@ -370,6 +618,8 @@ def get_history():
             language = user[0]['preferred_language']
 
         history_list = []
+        translation_job = TranslationJob(language)
+        translated_items = []
         for record in history:
             item = {
                 'id': record['id'],
@@ -384,17 +634,20 @@ def get_history():
             
             # Translate each record so it shows up in the user's language
             if language != 'en':
-                translated = translate_diagnosis_result(item, language)
-                
-                if 'disease_local' in translated:
-                    item['disease'] = translated['disease_local']
-                if 'crop_local' in translated:
-                    item['crop'] = translated['crop_local']
-                if 'stage_local' in translated:
-                    item['stage'] = translated['stage_local']
+                translated_items.append((item, translate_diagnosis_result(item, language, translation_job)))
             
             history_list.append(item)
         
+        # The whole page is translated in one go
+        translation_job.run()
+        for item, translated in translated_items:
+            if 'disease_local' in translated:
+                item['disease'] = translated['disease_local']
+            if 'crop_local' in translated:
+                item['crop'] = translated['crop_local']
+            if 'stage_local' in translated:
+                item['stage'] = translated['stage_local']
+        
         return jsonify({'history': history_list, 'page': page, 'per_page': per_page}), 200
         
     except Exception as e:
@@ -491,3 +744,15 @@ def get_voice_file(filename):
         return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@diagnosis_bp.route('/models', methods=['GET'])
+def get_model_stats():
+    """Show which crop models are resident, how long they took to load and how often they're used"""
+    try:
+        stats = model_registry.stats()
+        stats['micro_batching'] = inference_scheduler.stats()
+        stats['inference_service'] = inference_client.stats()
+        stats['prediction_cache'] = prediction_cache.stats()
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -29,6 +29,18 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # Initialize app directories
 settings.init_app()
 
+# `python app.py` without DEBUG runs the pre-forking production server (serve.py),
+# which loads the models itself before forking its workers
+PREFORK = __name__ == '__main__' and not settings.DEBUG and hasattr(os, 'fork')
+
+# Warm the model registry so the first diagnosis request doesn't pay the load cost.
+# TensorFlow is imported lazily, so this runs in the background and the process
+# starts serving (user, chatbot, weather, health) immediately
+if settings.PRELOAD_MODELS and not settings.INFERENCE_SERVICE_ADDRESS and not PREFORK:
+    import threading
+    from model_registry import model_registry
+    threading.Thread(target=model_registry.preload, name='model-preload', daemon=True).start()
+
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api/user')
 app.register_blueprint(diagnosis_bp, url_prefix='/api/diagnosis')
@@ -76,10 +88,12 @@ def api_info():
                 'PUT /api/user/language': 'Update preferred language'
             },
             'diagnosis': {
-                'POST /api/diagnosis/detect': 'Detect disease from image',
+                'POST /api/diagnosis/detect': 'Detect disease from image (crop optional with a crop model)',
+                'POST /api/diagnosis/detect/batch': 'Detect disease for many images of one crop',
                 'GET /api/diagnosis/history': 'Get diagnosis history',
                 'GET /api/diagnosis/<id>': 'Get diagnosis details',
-                'GET /api/diagnosis/voice/<filename>': 'Get voice file'
+                'GET /api/diagnosis/voice/<filename>': 'Get voice file',
+                'GET /api/diagnosis/models': 'Get loaded model statistics'
             },
             'cost': {
                 'POST /api/cost/calculate': 'Calculate treatment costs',
@@ -111,7 +125,12 @@ def index():
         "documentation": "Please refer to the README.md or SUCCESS_GUIDE.md in the project root."
     })
 
-if __name__ == '__main__':
+if __name__ == '__main__' and PREFORK:
+    from serve import serve
+    serve(app, settings.HOST, settings.PORT, settings.SERVER_WORKERS, settings.SERVER_GRACEFUL_TIMEOUT)
+
+elif __name__ == '__main__':
+    # Development server (DEBUG=True, or no fork() on Windows)
     print("=" * 60)
     print("🌾 AI CROP DIAGNOSIS API SERVER")
     print("=" * 60)
@@ -1,17 +1,56 @@
+import json
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+MANIFEST_FIELDS = ('crop', 'weights', 'class_names')
+
+
+def load_model_manifest(path, models_path):
+    """
+    Read the crop model manifest.
+
+    Returns:
+        List of dicts with crop, weights (absolute path), class_names,
+        input_size (default 224) and version (default None)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)['models']
+
+    manifest = []
+    for entry in entries:
+        missing = [field for field in MANIFEST_FIELDS if not entry.get(field)]
+        if missing:
+            raise ValueError(f"Model manifest {path}: entry {entry.get('crop', '?')} is missing {', '.join(missing)}")
+        manifest.append({
+            'crop': entry['crop'].lower(),
+            'weights': os.path.join(models_path, entry['weights']),
+            'class_names': list(entry['class_names']),
+            'input_size': int(entry.get('input_size', 224)),
+            'version': entry.get('version')
+        })
+
+    crops = [m['crop'] for m in manifest]
+    if len(crops) != len(set(crops)):
+        raise ValueError(f"Model manifest {path}: duplicate crop entries")
+    return manifest
+
+
 class Settings:
     """Application configuration settings"""
     
     # Flask settings
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
+    DEFAULT_SECRET_KEY = 'your-secret-key-change-in-production'
+    SECRET_KEY = os.getenv('SECRET_KEY', DEFAULT_SECRET_KEY)
     DEBUG = os.getenv('DEBUG', 'True') == 'True'
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
+    # Production server (serve.py): pre-forked worker processes, and how long a stopping
+    # worker may take to finish its in-flight requests on reload/shutdown
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 2))
+    SERVER_GRACEFUL_TIMEOUT = float(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
     
     # Database settings
     DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'crop_diagnosis.db')
@@ -20,33 +59,85 @@ class Settings:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    # Decode uploads from memory; originals are saved (in the background) only for history rows
+    IN_MEMORY_UPLOADS = os.getenv('IN_MEMORY_UPLOADS', 'True') == 'True'
+    MAX_BATCH_IMAGES = int(os.getenv('MAX_BATCH_IMAGES', 50))  # Images per /detect/batch request
+    # Total uncompressed size of the images in a /detect/batch zip, checked before extracting
+    MAX_ARCHIVE_EXTRACTED_SIZE = int(os.getenv('MAX_ARCHIVE_EXTRACTED_MB', 64)) * 1024 * 1024
+    # Uploads over 1 megapixel may decode to at most this many times their file size
+    # (checked from the header, before decoding - see utils/image_header.py)
+    MAX_DECOMPRESSION_RATIO = float(os.getenv('MAX_DECOMPRESSION_RATIO', 100))
+    # Decode large JPEGs at 1/2, 1/4 or 1/8 scale, down to the smallest size the models and the
+    # quality check need (see utils/upload_store.decode_min_side)
+    REDUCED_DECODE = os.getenv('REDUCED_DECODE', 'True') == 'True'
     
     # ML Model settings
     MODELS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'models')
-    MODEL_MAP = {
-        "tomato": os.path.join(MODELS_PATH, "tomato_disease_model.h5"),
-        "rice": os.path.join(MODELS_PATH, "rice_disease_model.h5"),
-        "wheat": os.path.join(MODELS_PATH, "wheat_disease_model.h5"),
-        "cotton": os.path.join(MODELS_PATH, "cotton_disease_model.h5")
-    }
+    # Crop models are listed in a manifest (crop, weights, class_names, input_size, version);
+    # weights paths are relative to MODELS_PATH. Adding a crop only needs a new entry there
+    MODEL_MANIFEST_PATH = os.getenv('MODEL_MANIFEST_PATH') or os.path.join(os.path.dirname(__file__), 'model_manifest.json')
+    MODEL_MANIFEST = load_model_manifest(MODEL_MANIFEST_PATH, MODELS_PATH)
+    MODEL_MAP = {m['crop']: m['weights'] for m in MODEL_MANIFEST}
+    CLASS_NAMES = {m['crop']: m['class_names'] for m in MODEL_MANIFEST}
+    # RAM for resident crop models (0 = unlimited); past it the least recently used crop is evicted
+    MODEL_MEMORY_BUDGET_MB = float(os.getenv('MODEL_MEMORY_BUDGET_MB', 0))
     
-    CLASS_NAMES = {
-        "tomato": [
-            "Healthy",
-            "Tomato___Bacterial_spot",
-            "Tomato___Early_blight",
-            "Tomato___Late_blight",
-            "Tomato___Leaf_Mold",
-            "Tomato___Septoria_leaf_spot",
-            "Tomato___Spider_mites Two-spotted_spider_mite",
-            "Tomato___Target_Spot",
-            "Tomato___Tomato_Yellow_Leaf_Curl_Virus",
-            "Tomato___Tomato_mosaic_virus"
-        ],
-        "rice": ["Healthy", "BrownSpot", "Hispa", "LeafBlast"],
-        "wheat": ["Healthy", "Brown rust", "Yellow rust", "Loose Smut"],
-        "cotton": ["Healthy", "Bacterial Blight", "Curl Virus", "Leaf Hopper Jassids"]
-    }
+    # Crop identifier for auto-crop mode (detect requests without a crop). Predictions below
+    # AUTO_CROP_MIN_CONFIDENCE percent are rejected so the user picks the crop instead
+    CROP_MODEL_PATH = os.getenv('CROP_MODEL_PATH', os.path.join(MODELS_PATH, "crop_classifier_model.h5"))
+    AUTO_CROP_MIN_CONFIDENCE = float(os.getenv('AUTO_CROP_MIN_CONFIDENCE', 60))
+    
+    # Inference runtime: 'keras', or 'tflite' / 'onnx' for models converted with
+    # ml/export_models.py (crops without an export fall back to Keras).
+    # INFERENCE_THREADS=0 leaves the thread count to the runtime
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras')
+    INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0))
+    EXPORTED_MODELS_PATH = os.getenv('EXPORTED_MODELS_PATH', os.path.join(MODELS_PATH, 'exported'))
+    # Crops served by their INT8-quantized TFLite export (comma separated, e.g. "rice,wheat");
+    # measure the accuracy cost first with ml/evaluate_quantization.py
+    QUANTIZED_CROPS = [c.strip() for c in os.getenv('QUANTIZED_CROPS', '').split(',') if c.strip()]
+    
+    # Keras models run through graph functions traced for these batch sizes; a batch is padded
+    # up to the nearest one. Empty uses plain model.predict()
+    INFERENCE_BATCH_BUCKETS = [int(b) for b in os.getenv('INFERENCE_BATCH_BUCKETS', '1,4,8,16,32').split(',') if b.strip()]
+    # Buckets traced when a model loads. Each costs about 1-2s of CPU per model, paid by the
+    # request that triggers a lazy load (or reload after eviction); every other bucket is traced
+    # by the first batch of its size instead. Listing all buckets moves that cost to load time
+    INFERENCE_WARM_BUCKETS = [int(b) for b in os.getenv('INFERENCE_WARM_BUCKETS', '1').split(',') if b.strip()]
+    
+    # Load every crop model at startup instead of on the first request for that crop
+    PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'False') == 'True'
+    # Keep one copy of the frozen MobileNetV2 backbone shared by all crop models and
+    # only their Dense heads (crops whose backbone differs keep their full model)
+    SHARED_BACKBONE = os.getenv('SHARED_BACKBONE', 'False') == 'True'
+    
+    # Out-of-process inference (ml/inference_service.py): with an address set, web processes load
+    # no models and send each prediction to the service's worker pool (shared memory on this host)
+    INFERENCE_SERVICE_ADDRESS = os.getenv('INFERENCE_SERVICE_ADDRESS', '')  # host:port, e.g. 127.0.0.1:6100
+    INFERENCE_SERVICE_WORKERS = int(os.getenv('INFERENCE_SERVICE_WORKERS', 2))
+    INFERENCE_SERVICE_TIMEOUT = float(os.getenv('INFERENCE_SERVICE_TIMEOUT', 30))  # seconds per call
+    # Shared secret of service and clients, required: connections carry pickled messages, so
+    # anyone holding it can run code in the service. Only loopback binds accept a default key
+    INFERENCE_SERVICE_AUTHKEY = os.getenv('INFERENCE_SERVICE_AUTHKEY', '')
+    
+    # Micro-batching: concurrent requests for the same crop are grouped for up to
+    # MICRO_BATCH_WINDOW_MS (0 disables) or MICRO_BATCH_MAX_SIZE images per model call
+    MICRO_BATCH_WINDOW_MS = float(os.getenv('MICRO_BATCH_WINDOW_MS', 0))
+    MICRO_BATCH_MAX_SIZE = int(os.getenv('MICRO_BATCH_MAX_SIZE', 16))
+    
+    # Tiled inference (ml/tiled_inference.py): score overlapping model-input tiles of the image
+    # scaled to a TILED_INFERENCE_SIDE short side instead of one center crop, so small lesions
+    # keep their detail. Background tiles are skipped; at most MAX_TILES_PER_IMAGE are scored
+    TILED_INFERENCE = os.getenv('TILED_INFERENCE', 'False') == 'True'
+    TILED_INFERENCE_SIDE = int(os.getenv('TILED_INFERENCE_SIDE', 672))
+    TILE_OVERLAP = float(os.getenv('TILE_OVERLAP', 0.25))  # Fraction of a tile shared with its neighbour
+    MAX_TILES_PER_IMAGE = int(os.getenv('MAX_TILES_PER_IMAGE', 16))
+    
+    # Prediction cache: duplicate uploads (same pixels, crop and model version) skip the pipeline.
+    # PREDICTION_CACHE_SIZE=0 disables; PREDICTION_CACHE_DB adds a persistent SQLite tier
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 1024))
+    PREDICTION_CACHE_TTL = int(os.getenv('PREDICTION_CACHE_TTL', 24 * 3600))  # seconds
+    PREDICTION_CACHE_DB = os.getenv('PREDICTION_CACHE_DB', '')
     
     # Supported languages
     SUPPORTED_LANGUAGES = {
@@ -61,6 +152,8 @@ class Settings:
     # Translation API settings (Google Translate)
     GOOGLE_TRANSLATE_API_KEY = os.getenv('GOOGLE_TRANSLATE_API_KEY', '')
     USE_FREE_TRANSLATION = os.getenv('USE_FREE_TRANSLATION', 'True') == 'True'  # Use googletrans library
+    TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', 5000))  # In-memory entries (all are kept in the DB)
+    TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', 8))  # Concurrent network translations
     
     # Text-to-Speech settings
     TTS_SERVICE = os.getenv('TTS_SERVICE', 'gtts')  # 'gtts' or 'google_cloud'
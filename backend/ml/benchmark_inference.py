@@ -0,0 +1,66 @@
+"""
+Benchmark: Keras model.predict() against the bucketed graph functions
+(CompiledModel) the model registry uses.
+
+Loads one crop model, checks both paths give the same probabilities, and
+reports per-call latency for each batch size (sizes between buckets show
+the cost of padding).
+
+Examples:
+    python benchmark_inference.py
+    python benchmark_inference.py --crop rice --batch-sizes 1 2 4 16 --iterations 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from disease_classifier import CompiledModel, load_disease_model
+
+
+def latency_ms(predict, batch, iterations):
+    predict(batch)  # Warm-up
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        predict(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.mean(timings)), float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model.predict() with bucketed graph functions")
+    parser.add_argument("--crop", default=next(iter(settings.MODEL_MAP)))
+    parser.add_argument("--batch-sizes", nargs="*", type=int, default=[1, 3, 4, 8, 16, 32])
+    parser.add_argument("--buckets", nargs="*", type=int, default=settings.INFERENCE_BATCH_BUCKETS or [1, 4, 8, 16, 32])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    spec = next(m for m in settings.MODEL_MANIFEST if m['crop'] == args.crop)
+    model = load_disease_model(spec['weights'], len(spec['class_names']), spec['input_size'])
+
+    start = time.perf_counter()
+    # Every bucket traced up front, so the timings below are steady state
+    compiled = CompiledModel(model, spec['input_size'], args.buckets, warm_buckets=args.buckets)
+    print(f"\nTraced and warmed buckets {args.buckets} in {time.perf_counter() - start:.2f}s "
+          f"(at load for INFERENCE_WARM_BUCKETS, else on first use of each)")
+
+    rng = np.random.default_rng(0)
+    keras_predict = lambda x: model.predict(x, verbose=0)
+    print(f"\n{'batch':>5}  {'predict() mean/p50/p99 ms':>28}  {'compiled mean/p50/p99 ms':>27}  {'speedup':>7}  max |Δp|")
+    for n in args.batch_sizes:
+        batch = rng.random((n, spec['input_size'], spec['input_size'], 3), dtype=np.float32)
+        diff = float(np.abs(keras_predict(batch) - compiled.predict(batch)).max())
+        k_mean, k_p50, k_p99 = latency_ms(keras_predict, batch, args.iterations)
+        c_mean, c_p50, c_p99 = latency_ms(compiled.predict, batch, args.iterations)
+        print(f"{n:>5}  {k_mean:>8.1f} {k_p50:>8.1f} {k_p99:>9.1f}  {c_mean:>8.1f} {c_p50:>8.1f} {c_p99:>8.1f}  "
+              f"{k_mean / c_mean:>6.2f}x  {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
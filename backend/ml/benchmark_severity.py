@@ -0,0 +1,91 @@
+"""
+Benchmark: cost of the lesion-aware severity engine over the old
+fraction-of-frame estimate.
+
+Both run on the 256x256 HSV view every request already computes (the
+content check shares it), so the difference is the leaf mask, connected
+components and statistics. Timings are repeated for the same images
+upscaled to phone-camera sizes to show the analysis cost does not grow
+with the upload.
+
+Examples:
+    python benchmark_severity.py
+    python benchmark_severity.py --images-dir ../../dataset/tomato/val --max-images 200
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from severity_estimator import LESION_HSV_LOWER, LESION_HSV_UPPER, analyzer
+from utils.decoded_image import DecodedImage
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+
+def frame_fraction(hsv):
+    """The old estimate: lesion-colored share of the whole frame"""
+    mask = cv2.inRange(hsv, LESION_HSV_LOWER, LESION_HSV_UPPER)
+    return cv2.countNonZero(mask) / mask.size * 100
+
+
+def per_image_ms(fn, views, repeats):
+    timings = []
+    for _ in range(repeats):
+        for hsv in views:
+            start = time.perf_counter()
+            fn(hsv)
+            timings.append((time.perf_counter() - start) * 1000)
+    return np.mean(timings), np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-image cost of lesion-aware severity")
+    parser.add_argument("--images-dir", default=settings.UPLOAD_FOLDER)
+    parser.add_argument("--max-images", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--sizes", nargs="*", type=int, default=[1024, 4000],
+                        help="Also time the images upscaled to these widths (4:3)")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.images_dir, '**', '*'), recursive=True)
+                   if p.lower().endswith(('.jpg', '.jpeg', '.png')))[:args.max_images]
+    images = [img for img in (DecodedImage.from_path(p) for p in paths) if img is not None]
+    if not images:
+        print(f"✗ No readable images in {args.images_dir}")
+        sys.exit(1)
+
+    lesion_analyzer = analyzer()
+    lesion_analyzer.analyze_hsv(images[0].hsv_256)  # Warm-up
+
+    print(f"\n{len(images)} images from {args.images_dir}, {args.repeats} repeats")
+    print(f"{'input':>11}  {'frame fraction mean/p50/p99 ms':>31}  {'lesion engine mean/p50/p99 ms':>30}  {'added ms':>8}")
+    sizes = [None] + args.sizes
+    for width in sizes:
+        if width is None:
+            label, views = "original", [img.hsv_256 for img in images]
+        else:
+            label = f"{width}x{width * 3 // 4}"
+            views = [DecodedImage(cv2.resize(img.bgr, (width, width * 3 // 4))).hsv_256 for img in images]
+        old = per_image_ms(frame_fraction, views, args.repeats)
+        new = per_image_ms(lesion_analyzer.analyze_hsv, views, args.repeats)
+        print(f"{label:>11}  {old[0]:>9.3f} {old[1]:>9.3f} {old[2]:>9.3f}  "
+              f"{new[0]:>9.3f} {new[1]:>9.3f} {new[2]:>9.3f}  {new[0] - old[0]:>8.3f}")
+
+    stats = [lesion_analyzer.analyze_hsv(img.hsv_256) for img in images]
+    old_severity = np.mean([frame_fraction(img.hsv_256) for img in images])
+    print(f"\nMean severity: {old_severity:.2f}% of frame -> "
+          f"{np.mean([s['severity_percent'] for s in stats]):.2f}% of leaf "
+          f"(leaf covers {np.mean([s['leaf_coverage_percent'] for s in stats]):.1f}% of the frame, "
+          f"{np.mean([s['lesion_count'] for s in stats]):.1f} lesions per image)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Offline bulk diagnosis over a directory of images or a manifest file.
+
+Images are decoded (and their severity computed) in a pool of worker
+processes; the main process runs batched model inference and streams
+results to CSV or JSONL. Re-running with --resume skips images already
+present in the output file.
+
+Examples:
+    python bulk_diagnose.py ../uploads --crop tomato --output scores.csv
+    python bulk_diagnose.py eval_manifest.csv --output scores.jsonl --resume
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Only light imports here: spawned decode workers re-import this module,
+# and they must not pay for TensorFlow
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+
+from config.settings import settings
+from utils.decoded_image import DecodedImage, center_crop
+from severity_estimator import estimate_severity
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+OUTPUT_FIELDS = ['image_path', 'crop', 'disease', 'confidence', 'severity_percent', 'stage', 'error']
+
+
+def find_images(source, default_crop):
+    """
+    Yield (image_path, crop) from a directory (walked recursively) or a
+    manifest (.txt with one path per line, or .csv with 'path' and an
+    optional 'crop' column; relative paths are relative to the manifest)
+    """
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name), default_crop
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8', newline='') as f:
+        if source.lower().endswith('.csv'):
+            rows = ((row['path'], row.get('crop') or default_crop) for row in csv.DictReader(f))
+        else:
+            rows = ((line.strip(), default_crop) for line in f if line.strip())
+
+        for path, crop in rows:
+            yield os.path.join(base_dir, path), crop
+
+
+def load_checkpoint(output_path):
+    """Image paths already written to a previous run's output"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, 'r', encoding='utf-8', newline='') as f:
+        if output_path.endswith('.jsonl'):
+            for line in f:
+                try:
+                    done.add(json.loads(line)['image_path'])
+                except (ValueError, KeyError):
+                    continue  # Partially written last line from an interrupted run
+        else:
+            done.update(row['image_path'] for row in csv.DictReader(f))
+    return done
+
+
+def decode_worker_init():
+    # One OpenCV thread per process: parallelism comes from the pool
+    cv2.setNumThreads(1)
+
+
+def decode_image(task):
+    """Worker: decode one image and return its classifier crop (at the crop model's input size) and severity"""
+    path, crop, input_size = task
+    try:
+        img = DecodedImage.from_path(path)
+        if img is None:
+            return path, crop, None, None, 'Unable to read image file'
+        return path, crop, center_crop(img.rgb, input_size), estimate_severity(img), None
+    except Exception as e:
+        return path, crop, None, None, str(e)
+
+
+class ResultWriter:
+    """Append-only CSV/JSONL writer, flushed after every batch"""
+
+    def __init__(self, output_path, append):
+        self.jsonl = output_path.endswith('.jsonl')
+        write_header = not (append and os.path.exists(output_path))
+        self._file = open(output_path, 'a' if append else 'w', encoding='utf-8', newline='')
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS)
+            if write_header:
+                self._csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.jsonl:
+                self._file.write(json.dumps(row) + '\n')
+            else:
+                self._csv.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def run(args):
+    # Heavy imports (TensorFlow) only in the main process
+    from final_predictor import build_result, classify_batch
+    from stage_classifier import classify_stages
+    from utils.decoded_image import normalize
+
+    done = load_checkpoint(args.output) if args.resume else set()
+    tasks = [(p, c.lower() if c else c) for p, c in find_images(args.source, args.crop) if p not in done]
+    missing_crop = [p for p, c in tasks if not c]
+    if missing_crop:
+        raise SystemExit(f"No crop given for {len(missing_crop)} images (use --crop or a manifest 'crop' column)")
+    # Checked up front: an unknown crop would otherwise only fail at its first batch
+    input_sizes = {m['crop']: m['input_size'] for m in settings.MODEL_MANIFEST}
+    unknown = sorted({c for _, c in tasks} - set(input_sizes))
+    if unknown:
+        raise SystemExit(f"Not in the model manifest: {', '.join(unknown)} (known: {', '.join(input_sizes)})")
+    tasks = [(p, c, input_sizes[c]) for p, c in tasks]
+
+    print(f"Skipping {len(done)} already processed images" if done else "Starting fresh run")
+    print(f"Diagnosing {len(tasks)} images with {args.workers} decode workers, batch size {args.batch_size}")
+
+    writer = ResultWriter(args.output, append=args.resume)
+    pending = {}  # crop -> list of (path, crop_pixels, severity)
+    processed = 0
+    next_report = args.report_every
+    start = time.perf_counter()
+
+    def flush(crop):
+        nonlocal processed
+        items = pending.pop(crop, [])
+        if not items:
+            return
+        labels = classify_batch([normalize(pixels) for _, pixels, _ in items], crop)
+        stages = classify_stages([severity for _, _, severity in items])
+        rows = []
+        for (path, _, severity), (disease, confidence), stage in zip(items, labels, stages):
+            row = build_result(crop, disease, confidence, severity, stage)
+            row.update({'image_path': path, 'error': ''})
+            rows.append(row)
+        writer.write(rows)
+        processed += len(rows)
+
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ctx.Pool(args.workers, initializer=decode_worker_init) as pool:
+            for path, crop, pixels, severity, error in pool.imap(decode_image, tasks, chunksize=4):
+                if error:
+                    writer.write([{'image_path': path, 'crop': crop, 'error': error}])
+                    processed += 1
+                else:
+                    pending.setdefault(crop, []).append((path, pixels, severity))
+                    if len(pending[crop]) >= args.batch_size:
+                        flush(crop)
+
+                if processed >= next_report:
+                    next_report = processed + args.report_every
+                    elapsed = time.perf_counter() - start
+                    print(f"{processed}/{len(tasks)} images, {processed / elapsed:.1f} images/sec")
+
+            for crop in list(pending):
+                flush(crop)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {processed} images in {elapsed:.1f}s ({rate:.1f} images/sec) -> {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk crop disease diagnosis")
+    parser.add_argument("source", help="Image directory or manifest (.txt / .csv)")
+    parser.add_argument("--crop", help="Crop for all images (unless the manifest has a 'crop' column)")
+    parser.add_argument("--output", required=True, help="Results file (.csv or .jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Decode processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per model call")
+    parser.add_argument("--resume", action="store_true", help="Skip images already in the output file")
+    parser.add_argument("--report-every", type=int, default=100, help="Print throughput every N images")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
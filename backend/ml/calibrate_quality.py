@@ -0,0 +1,153 @@
+"""
+Check the image quality check's proxy scores against full resolution.
+
+check_image_quality scores a grayscale proxy of each image with a short
+side of at most QUALITY_PROXY_SIZE (utils/image_quality_check.py), as the
+upload pipeline decodes it. This scores a folder of photos both that way
+and the old full-resolution way (full decode, CV_64F Laplacian, separate
+mean/std), and reports:
+  - brightness / contrast drift between the two
+  - pass/fail agreement between the two
+  - with --blur-check, how many blurry upscaled copies (cubic, to the given
+    width) each rejects
+  - with --sharp-check, how many sharp mosaics of the images (tiled at
+    their own resolution, to the given side) each accepts
+  - per-image time of both, and of scoring the whole set as one batch
+
+Blurry upscales look sharp once shrunk far enough, and sharp photos lose no
+blur score at any scale, so in both checks the proxy should match full
+resolution. Run it on full-size field photos before changing
+QUALITY_PROXY_SIZE or PROXY_BLUR_VARIANCE.
+
+Examples:
+    python calibrate_quality.py --images-dir ~/field_photos
+    python calibrate_quality.py --images-dir ../uploads --blur-check 4000 --sharp-check 3072
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from utils.decoded_image import DecodedImage
+from utils.image_quality_check import quality_metrics, quality_scores
+from utils.lazy_import import lazy_import
+from utils.upload_store import decode_min_side
+
+cv2 = lazy_import('cv2')
+
+MOSAIC_TILE = 256
+
+
+def full_resolution_metrics(bgr):
+    """The check as it ran before the proxy: full-size float Laplacian"""
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(gray, cv2.CV_64F).var(), np.mean(gray), np.std(gray)
+
+
+def passes(metrics):
+    """Pass/fail of (N, 3) metrics with the current thresholds"""
+    return quality_scores(*metrics.T)['is_valid']
+
+
+def score_both(encoded):
+    """(full-resolution metrics, proxy metrics, proxy seconds) of encoded images"""
+    full, proxy, seconds = [], [], 0.0
+    for data in encoded:
+        start = time.perf_counter()
+        img = DecodedImage.from_bytes(data, min_side=decode_min_side())
+        if img is None:
+            continue
+        proxy.append(np.stack(quality_metrics([img.quality_proxy]), axis=1)[0])
+        seconds += time.perf_counter() - start
+        full.append(full_resolution_metrics(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)))
+    return np.array(full), np.array(proxy), seconds
+
+
+def encode_jpeg(bgr):
+    return cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def sharp_mosaics(decoded, side, count, seed=0):
+    """Images of side x side pixels tiled from random images at their own resolution"""
+    tiles = [cv2.resize(bgr, (MOSAIC_TILE, MOSAIC_TILE), interpolation=cv2.INTER_AREA) for bgr in decoded]
+    n = side // MOSAIC_TILE
+    rng = np.random.default_rng(seed)
+    mosaics = []
+    for _ in range(count):
+        picks = rng.integers(0, len(tiles), n * n)
+        rows = [np.hstack([tiles[picks[r * n + c]] for c in range(n)]) for r in range(n)]
+        mosaics.append(encode_jpeg(np.vstack(rows)))
+    return mosaics
+
+
+def print_check(label, expect_pass, full, proxy):
+    full_rate, proxy_rate = passes(full).mean(), passes(proxy).mean()
+    if not expect_pass:
+        full_rate, proxy_rate = 1 - full_rate, 1 - proxy_rate
+    verb = 'accepted' if expect_pass else 'rejected'
+    # The proxy should do at least as well as full resolution, give or take an image in 20
+    print(f"{'✓' if proxy_rate >= full_rate - 0.05 else '✗'} {label}: {verb} by full resolution "
+          f"{full_rate:.2%}, by the proxy {proxy_rate:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the quality check's proxy scores with full-resolution ones")
+    parser.add_argument("--images-dir", default=settings.UPLOAD_FOLDER)
+    parser.add_argument("--max-images", type=int, default=1000)
+    parser.add_argument("--blur-check", type=int, metavar="WIDTH",
+                        help="Also score blurry copies upscaled (4:3) to this width")
+    parser.add_argument("--sharp-check", type=int, metavar="SIDE",
+                        help="Also score sharp square mosaics of the images with this side")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.images_dir, '**', '*'), recursive=True)
+                   if p.lower().endswith(('.jpg', '.jpeg', '.png')))[:args.max_images]
+    encoded = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            encoded.append(f.read())
+
+    start = time.perf_counter()
+    full, proxy, proxy_seconds = score_both(encoded)
+    full_seconds = time.perf_counter() - start - proxy_seconds
+    n = len(full)
+    if not n:
+        print(f"✗ No readable images in {args.images_dir}")
+        sys.exit(1)
+
+    images = [img for img in (DecodedImage.from_bytes(data, min_side=decode_min_side()) for data in encoded) if img]
+    start = time.perf_counter()
+    quality_scores(*quality_metrics([img.quality_proxy for img in images]))
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n{n} images from {args.images_dir}")
+    print(f"Brightness drift: mean |Δ| {np.abs(proxy[:, 1] - full[:, 1]).mean():.2f} gray levels")
+    print(f"Contrast drift:   mean |Δ| {np.abs(proxy[:, 2] - full[:, 2]).mean():.2f} gray levels")
+    reference, current = passes(full), passes(proxy)
+    print(f"{'✓' if (current == reference).all() else '✗'} Pass/fail agreement with full resolution: "
+          f"{(current == reference).mean():.2%} ({reference.sum()} of {n} pass at full resolution)")
+
+    decoded = [bgr for bgr in (cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for data in encoded)
+               if bgr is not None]
+    if args.blur_check:
+        width, height = args.blur_check, args.blur_check * 3 // 4
+        blurry = [encode_jpeg(cv2.resize(bgr, (width, height), interpolation=cv2.INTER_CUBIC)) for bgr in decoded]
+        b_full, b_proxy, _ = score_both(blurry)
+        print_check(f"Blurry copies at {width}x{height}", False, b_full, b_proxy)
+    if args.sharp_check:
+        mosaics = sharp_mosaics(decoded, args.sharp_check, min(len(decoded), 20))
+        s_full, s_proxy, _ = score_both(mosaics)
+        print_check(f"Sharp mosaics at {args.sharp_check}x{args.sharp_check}", True, s_full, s_proxy)
+
+    print(f"\nPer image: full resolution {full_seconds / n * 1000:.2f} ms, "
+          f"decode + proxy {proxy_seconds / n * 1000:.2f} ms; batch of {n} scored in {batch_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
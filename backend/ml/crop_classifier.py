@@ -1,21 +1,73 @@
-import cv2
+import os
+import sys
+
 import numpy as np
-from tensorflow.keras.models import load_model
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from utils.decoded_image import DecodedImage
 
 CROP_NAMES = ["rice", "wheat", "tomato", "cotton"]
 
-def predict_crop(image_path, model_path):
-    model = load_model(model_path)
+# Name of the crop identifier's output in ModelRegistry.predict_entries
+CROP_IDENTIFIER = "crop_identifier"
+
+
+def auto_crop_available():
+    return os.path.exists(settings.CROP_MODEL_PATH)
+
+
+def get_crop_model(model_path=None):
+    """The resident crop identifier (loaded once, through the model registry)"""
+    from inference_client import inference_client
+    if inference_client.enabled and model_path is None:
+        return inference_client.get(CROP_IDENTIFIER)
+
+    from model_registry import model_registry
+    return model_registry.get_for_path(model_path or settings.CROP_MODEL_PATH, CROP_NAMES)
+
 
-    img = cv2.imread(image_path)
+def identify_crop(image):
+    """
+    Identify the crop in a decoded image.
+
+    The crop model reads the same 224 classifier tensor as the disease
+    models. When it sits on the shared backbone, the identified crop's
+    disease is scored in the same pass (one backbone evaluation, one matmul
+    over every head), so it is returned too.
+
+    Returns:
+        (crop, crop_confidence_percent, (disease, confidence) or None)
+    """
+    from model_registry import model_registry
+    from disease_classifier import decode_prediction
+
+    crop_entry = get_crop_model()
+    batch = np.expand_dims(image.classifier_input, axis=0)
+
+    if not crop_entry.shared_backbone:
+        crop, confidence = decode_prediction(crop_entry.predict(batch)[0], CROP_NAMES)
+        return crop, float(confidence), None
+
+    entries = {crop: model_registry.get(crop, record_hit=False) for crop in CROP_NAMES if crop in model_registry.crops()}
+    entries[CROP_IDENTIFIER] = crop_entry
+    probs = model_registry.predict_entries(batch, entries)
+
+    crop, confidence = decode_prediction(probs[CROP_IDENTIFIER][0], CROP_NAMES)
+    if crop not in entries:
+        return crop, float(confidence), None
+    model_registry.get(crop)  # Count the hit for the crop actually used
+    return crop, float(confidence), decode_prediction(probs[crop][0], entries[crop].class_names)
+
+
+def predict_crop(image_path, model_path=None):
+    img = DecodedImage.from_path(image_path)
     if img is None:
         raise ValueError("Invalid image path")
 
-    img = cv2.resize(img, (224, 224))
-    img = img / 255.0
-    img = np.expand_dims(img, axis=0)
-
-    preds = model.predict(img)
+    batch = np.expand_dims(img.classifier_input, axis=0)
+    preds = get_crop_model(model_path).predict(batch)
     idx = int(np.argmax(preds))
 
     return CROP_NAMES[idx]
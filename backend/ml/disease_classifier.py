@@ -1,15 +1,25 @@
-import cv2
+import hashlib
 import numpy as np
-import tensorflow as tf
 import os
+import sys
+import threading
+import time
 
-def build_mobilenet_model(num_classes):
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.decoded_image import DecodedImage
+from utils.lazy_import import lazy_import
+
+# Only imported when a Keras model is actually built
+tf = lazy_import('tensorflow')
+
+def build_mobilenet_model(num_classes, input_size=224):
     """
     Reconstructs the model architecture used during training.
     Based on the inspection, it's MobileNetV2 -> GlobalAveragePooling2D -> Dropout -> Dense
     """
     base_model = tf.keras.applications.MobileNetV2(
-        input_shape=(224, 224, 3),
+        input_shape=(input_size, input_size, 3),
         include_top=False,
         weights=None
     )
@@ -24,6 +34,164 @@ def build_mobilenet_model(num_classes):
     
     return model
 
+def load_disease_model(model_path, num_classes, input_size=224):
+    """
+    Build the MobileNetV2 architecture and load trained weights into it.
+    This is the expensive step, so callers should go through the model registry.
+
+    A file whose weights don't fit the rebuilt architecture is loaded as a
+    full saved model instead (architecture included), and failing that by
+    layer name. Raises ValueError rather than return a model with any layer
+    left at its random initial weights.
+    """
+    print(f"Loading weights from: {model_path}")
+    print(f"Rebuilding MobileNetV2 for {num_classes} classes...")
+    model = build_mobilenet_model(num_classes, input_size)
+    
+    try:
+        model.load_weights(model_path)
+    except Exception as w_err:
+        print(f"Standard load failed, trying it as a saved model: {w_err}")
+        saved = _load_saved_model(model_path)
+        if saved is not None:
+            _check_saved_model(saved, model_path, num_classes, input_size)
+            print("Saved model loaded successfully!")
+            return saved
+        print("Not a saved model, loading weights by layer name")
+        skipped = _load_weights_by_name(model, model_path)
+        if skipped:
+            raise ValueError(
+                f"{model_path} does not fit the MobileNetV2 architecture for {num_classes} classes: "
+                f"{len(skipped)} layers not loaded ({', '.join(skipped[:5])}{', ...' if len(skipped) > 5 else ''})"
+            )
+    
+    print("Model weights loaded successfully!")
+    return model
+
+def _load_saved_model(model_path):
+    try:
+        return tf.keras.models.load_model(model_path, compile=False)
+    except Exception as e:
+        print(f"DEBUG: {model_path} is not a loadable saved model: {e}")
+        return None
+
+def _check_saved_model(model, model_path, num_classes, input_size):
+    inputs, outputs = model.input_shape, model.output_shape
+    if tuple(inputs[1:3]) != (input_size, input_size) or outputs[-1] != num_classes:
+        raise ValueError(
+            f"{model_path} takes {inputs[1:]} and returns {outputs[-1]} classes, "
+            f"expected ({input_size}, {input_size}, 3) and {num_classes}"
+        )
+
+def _load_weights_by_name(model, model_path):
+    """Load matching layers by name; returns the names of layers that kept their initial weights"""
+    layers = [layer for layer in model.layers if layer.weights]
+    initial = [[w.copy() for w in layer.get_weights()] for layer in layers]
+    model.load_weights(model_path, by_name=True, skip_mismatch=True)
+    return [layer.name for layer, before in zip(layers, initial)
+            if all(np.array_equal(a, b) for a, b in zip(before, layer.get_weights()))]
+
+class CompiledModel:
+    """
+    A Keras model called through graph functions traced once per batch bucket.
+
+    model.predict() sets up Keras' generic data pipeline on every call, which
+    dominates the latency of small batches. Here each bucket size gets a
+    concrete function with a fixed input signature. A batch is zero-padded
+    up to the nearest bucket; batches larger than the biggest bucket run in
+    chunks.
+
+    Tracing and warming a bucket costs about 1-2 s of CPU, so only
+    warm_buckets are traced at construction (on the model load). The other
+    buckets are traced by the first batch that needs them, which pays that
+    once per loaded model.
+    """
+
+    backend = 'keras'
+
+    def __init__(self, model, input_size=224, buckets=(1, 4, 8, 16, 32), warm_buckets=(1,)):
+        self.model = model
+        self.input_size = input_size
+        self.buckets = sorted(buckets)
+        self._call = tf.function(lambda x: model(x, training=False))
+        self._functions = {}
+        self._trace_lock = threading.Lock()
+        for size in self.buckets:
+            if size in warm_buckets:
+                self._function(size)
+
+    def _function(self, size):
+        """The bucket's concrete function, traced and warmed on first use"""
+        fn = self._functions.get(size)
+        if fn is not None:
+            return fn
+        with self._trace_lock:
+            if size not in self._functions:
+                start = time.perf_counter()
+                fn = self._call.get_concrete_function(tf.TensorSpec([size, self.input_size, self.input_size, 3], tf.float32))
+                fn(tf.zeros([size, self.input_size, self.input_size, 3]))  # Warm-up run
+                self._functions[size] = fn
+                print(f"DEBUG: Traced batch bucket {size} in {time.perf_counter() - start:.2f}s")
+            return self._functions[size]
+
+    @property
+    def traced_buckets(self):
+        return sorted(self._functions)
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.buckets[-1]
+        if len(batch) > largest:
+            return np.concatenate([self.predict(batch[i:i + largest]) for i in range(0, len(batch), largest)])
+
+        n = len(batch)
+        size = next(b for b in self.buckets if b >= n)
+        if size != n:
+            padded = np.zeros((size,) + batch.shape[1:], dtype=np.float32)
+            padded[:n] = batch
+            batch = padded
+        return self._function(size)(tf.constant(batch)).numpy()[:n]
+
+    def get_weights(self):
+        return self.model.get_weights()
+
+
+def split_backbone(model):
+    """
+    Split a crop model into its backbone (image -> 1280-d pooled feature)
+    and the weights of its final Dense softmax head.
+    Returns (feature_extractor, kernel, bias), or None for a model of
+    another architecture (e.g. a full saved model, see load_disease_model).
+    """
+    pool = next((l for l in model.layers if isinstance(l, tf.keras.layers.GlobalAveragePooling2D)), None)
+    if pool is None or not isinstance(model.layers[-1], tf.keras.layers.Dense):
+        return None
+    kernel, bias = model.layers[-1].get_weights()
+    extractor = tf.keras.models.Model(inputs=model.input, outputs=pool.output)
+    return extractor, kernel, bias
+
+def weights_fingerprint(model):
+    """SHA-256 over a model's weight values (identical backbones hash equal)"""
+    digest = hashlib.sha256()
+    for w in model.get_weights():
+        digest.update(np.ascontiguousarray(w).tobytes())
+    return digest.hexdigest()
+
+def classify(image, entry):
+    """
+    Classify a decoded image with a registry model entry.
+    Returns (disease_name, confidence_percent).
+    """
+    batch = np.expand_dims(image.classifier_input_at(entry.input_size), axis=0)
+    preds = entry.predict(batch)
+    return decode_prediction(preds[0], entry.class_names)
+
+def decode_prediction(probs, class_names):
+    """Map one row of softmax output to (disease_name, confidence_percent)"""
+    idx = np.argmax(probs)
+    confidence = np.max(probs) * 100
+    return class_names[idx], confidence
+
 def predict(image_path, model_path, class_names):
     try:
         # Input validation
@@ -34,60 +202,17 @@ def predict(image_path, model_path, class_names):
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
         
-        print(f"Loading weights from: {model_path}")
-        
-        # 1. Rebuild the model architecture
-        num_classes = len(class_names)
-        print(f"Rebuilding MobileNetV2 for {num_classes} classes...")
-        model = build_mobilenet_model(num_classes)
+        # 1. Get the resident model (built and loaded only on first use)
+        from model_registry import model_registry
+        entry = model_registry.get_for_path(model_path, class_names)
         
-        # 2. Load weights
-        try:
-            model.load_weights(model_path)
-        except Exception as w_err:
-            print(f"Standard load failed, trying by_name: {w_err}")
-            model.load_weights(model_path, by_name=True, skip_mismatch=True)
-        
-        print("Model weights loaded successfully!")
-        
-        # 3. Read and preprocess image
-        img = cv2.imread(image_path)
+        # 2. Read and preprocess image
+        img = DecodedImage.from_path(image_path)
         if img is None:
             raise ValueError(f"Image not found or cannot be read: {image_path}")
         
-        # CRITICAL: Convert BGR to RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Center crop preprocessing (preserves aspect ratio without padding)
-        # This is a common technique in image classification
-        h, w = img.shape[:2]
-        target_size = 224
-        
-        # Resize so smaller dimension = target_size
-        if h < w:
-            new_h = target_size
-            new_w = int(w * (target_size / h))
-        else:
-            new_w = target_size
-            new_h = int(h * (target_size / w))
-        
-        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-        
-        # Center crop to target_size x target_size
-        h, w = img.shape[:2]
-        start_y = (h - target_size) // 2
-        start_x = (w - target_size) // 2
-        img = img[start_y:start_y+target_size, start_x:start_x+target_size]
-        
-        # Normalize to [0, 1]
-        img = img.astype(np.float32) / 255.0
-        img = np.expand_dims(img, axis=0)
-        
-        # 4. Prediction
-        preds = model.predict(img, verbose=0)
-        idx = np.argmax(preds)
-        confidence = np.max(preds) * 100
-        disease_name = class_names[idx]
+        # 3. Prediction
+        disease_name, confidence = classify(img, entry)
         
         print(f"Prediction: {disease_name} ({confidence:.2f}%)")
         return disease_name, confidence
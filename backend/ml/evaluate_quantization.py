@@ -0,0 +1,168 @@
+"""
+Accuracy regression harness for the INT8 crop models.
+
+Scores a set of images with the float Keras model and its INT8 TFLite
+export and reports, per crop:
+  - top-1 agreement with the float model
+  - probability drift (mean / max absolute difference)
+  - per-class confidence drift, grouped by the float model's prediction
+  - model size and single-image latency of both (and of the float TFLite
+    export when there is one, which isolates the gain from quantization)
+
+The images used for INT8 calibration (same seeded sample as
+export_models.py) are excluded from evaluation. Exits non-zero when a crop
+falls below --min-agreement, so it can gate QUANTIZED_CROPS changes.
+
+Examples:
+    python evaluate_quantization.py
+    python evaluate_quantization.py --crops rice --eval-dir ../../dataset/rice/val --report quant.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from disease_classifier import load_disease_model
+from export_models import calibration_images, model_specs
+from runtime_backends import load_runtime_model
+from utils.decoded_image import DecodedImage
+
+BATCH_SIZE = 32
+LATENCY_SAMPLES = 20
+
+
+def load_eval_images(paths, max_images):
+    images = []
+    for path in paths:
+        img = DecodedImage.from_path(path)
+        if img is not None:
+            images.append(img)
+        if len(images) >= max_images:
+            break
+    return images
+
+
+def predict_all(predict, batch):
+    return np.concatenate([predict(batch[i:i + BATCH_SIZE]) for i in range(0, len(batch), BATCH_SIZE)])
+
+
+def single_image_latency_ms(predict, batch):
+    samples = batch[:LATENCY_SAMPLES]
+    predict(samples[:1])  # Warm-up (graph tracing / tensor allocation)
+    start = time.perf_counter()
+    for i in range(len(samples)):
+        predict(samples[i:i + 1])
+    return (time.perf_counter() - start) / len(samples) * 1000
+
+
+def compare(spec, images):
+    model_path, class_names = spec['weights'], spec['class_names']
+    quantized, quantized_path = load_runtime_model(model_path, 'tflite_int8', settings.INFERENCE_THREADS)
+    if quantized is None:
+        return None
+
+    batch = np.stack([img.classifier_input_at(spec['input_size']) for img in images])
+    reference = load_disease_model(model_path, len(class_names), spec['input_size'])
+    reference_predict = lambda x: reference.predict(x, verbose=0)
+
+    ref_probs = predict_all(reference_predict, batch)
+    q_probs = predict_all(quantized.predict, batch)
+    ref_top1 = ref_probs.argmax(axis=1)
+    q_top1 = q_probs.argmax(axis=1)
+    diff = np.abs(ref_probs - q_probs)
+
+    per_class = {}
+    for idx, name in enumerate(class_names):
+        mask = ref_top1 == idx
+        if not mask.any():
+            continue
+        ref_conf = float(ref_probs[mask, idx].mean() * 100)
+        q_conf = float(q_probs[mask, idx].mean() * 100)
+        per_class[name] = {
+            'images': int(mask.sum()),
+            'agreement': round(float((q_top1[mask] == idx).mean()), 4),
+            'float_confidence': round(ref_conf, 2),
+            'int8_confidence': round(q_conf, 2),
+            'confidence_drift': round(q_conf - ref_conf, 2)
+        }
+
+    float_ms = single_image_latency_ms(reference_predict, batch)
+    int8_ms = single_image_latency_ms(quantized.predict, batch)
+    # Same runtime without quantization, to separate INT8 gains from Keras overhead
+    float_tflite, _ = load_runtime_model(model_path, 'tflite', settings.INFERENCE_THREADS)
+    float_tflite_ms = single_image_latency_ms(float_tflite.predict, batch) if float_tflite else None
+    return {
+        'images': len(batch),
+        'top1_agreement': round(float((ref_top1 == q_top1).mean()), 4),
+        'mean_abs_prob_diff': round(float(diff.mean()), 5),
+        'max_abs_prob_diff': round(float(diff.max()), 5),
+        'per_class': per_class,
+        'float_size_mb': round(os.path.getsize(model_path) / (1024 * 1024), 2),
+        'int8_size_mb': round(os.path.getsize(quantized_path) / (1024 * 1024), 2),
+        'float_latency_ms': round(float_ms, 2),
+        'float_tflite_latency_ms': round(float_tflite_ms, 2) if float_tflite_ms else None,
+        'int8_latency_ms': round(int8_ms, 2),
+        'speedup': round(float_ms / int8_ms, 2) if int8_ms else None
+    }
+
+
+def print_report(crop, report, min_agreement):
+    ok = report['top1_agreement'] >= min_agreement
+    print(f"\n{'✓' if ok else '✗'} {crop}: top-1 agreement {report['top1_agreement']:.2%} on {report['images']} images, "
+          f"mean |Δp| {report['mean_abs_prob_diff']:.4f}, max |Δp| {report['max_abs_prob_diff']:.4f}")
+    print(f"  size {report['float_size_mb']} MB -> {report['int8_size_mb']} MB, "
+          f"latency {report['float_latency_ms']} ms -> {report['int8_latency_ms']} ms ({report['speedup']}x)"
+          + (f", float TFLite {report['float_tflite_latency_ms']} ms" if report['float_tflite_latency_ms'] else ""))
+    for name, stats in report['per_class'].items():
+        print(f"  {name:<45} n={stats['images']:<4} agree {stats['agreement']:.0%}  "
+              f"conf {stats['float_confidence']:.1f}% -> {stats['int8_confidence']:.1f}% ({stats['confidence_drift']:+.1f})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare INT8 crop models against the float models")
+    parser.add_argument("--crops", nargs="*", help="Crops to evaluate (default: all with an INT8 export)")
+    parser.add_argument("--eval-dir", help="Evaluation images (default: the upload folder)")
+    parser.add_argument("--max-images", type=int, default=500)
+    parser.add_argument("--calibration-dir", help="Calibration images to exclude (as passed to export_models.py)")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Minimum top-1 agreement per crop")
+    parser.add_argument("--report", help="Also write the full report as JSON")
+    args = parser.parse_args()
+
+    calibration = set(calibration_images(args.calibration_dir, args.calibration_samples))
+    paths = calibration_images(args.eval_dir, samples=None)
+    held_out = [p for p in paths if p not in calibration]
+    if not held_out:
+        print("WARNING: every evaluation image was used for calibration; evaluating on them anyway")
+        held_out = paths
+
+    images = load_eval_images(held_out, args.max_images)
+    if not images:
+        raise SystemExit("No readable evaluation images")
+
+    reports = {}
+    failures = 0
+    for spec in model_specs(args.crops):
+        crop = spec['crop']
+        report = compare(spec, images)
+        if report is None:
+            print(f"\n- {crop}: no INT8 export (export_models.py --format tflite_int8), skipped")
+            continue
+        reports[crop] = report
+        failures += not print_report(crop, report, args.min_agreement)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
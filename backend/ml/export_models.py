@@ -0,0 +1,154 @@
+"""
+Convert the Keras crop models in settings.MODEL_MAP for a CPU runtime backend.
+
+Writes <model name>.tflite, .int8.tflite or .onnx into
+settings.EXPORTED_MODELS_PATH, where the model registry picks them up
+(INFERENCE_BACKEND, or QUANTIZED_CROPS for the INT8 variants). Check the
+converted models with test_backend_parity.py / evaluate_quantization.py.
+
+INT8 post-training quantization is calibrated on a seeded random sample of
+stored uploads; evaluate_quantization.py holds the same sample out.
+
+Examples:
+    python export_models.py --format tflite
+    python export_models.py --format tflite_int8 --calibration-samples 300
+    python export_models.py --format onnx --crops tomato rice
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import tensorflow as tf
+
+from config.settings import settings
+from disease_classifier import load_disease_model
+from runtime_backends import BACKEND_EXTENSIONS, exported_model_path
+from utils.decoded_image import DecodedImage
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+CALIBRATION_SEED = 1234
+
+
+def calibration_images(image_dir=None, samples=200, seed=CALIBRATION_SEED):
+    """Seeded random sample of stored uploads used to calibrate INT8 ranges"""
+    image_dir = image_dir or settings.UPLOAD_FOLDER
+    paths = sorted(
+        p for p in glob.glob(os.path.join(image_dir, '**', '*'), recursive=True)
+        if p.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    random.Random(seed).shuffle(paths)
+    return paths[:samples]
+
+
+def export_saved_model(model, export_dir):
+    """Keras 3 -> SavedModel; its serving signature keeps a dynamic batch dimension"""
+    model.export(export_dir, format='tf_saved_model', verbose=False)
+
+
+def export_tflite(model, output_path):
+    with tempfile.TemporaryDirectory() as export_dir:
+        export_saved_model(model, export_dir)
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir)
+        tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+
+def model_specs(crops=None):
+    """Manifest entries of the given crops (default: all), in manifest order"""
+    specs = {m['crop']: m for m in settings.MODEL_MANIFEST}
+    unknown = [crop for crop in crops or [] if crop not in specs]
+    if unknown:
+        raise SystemExit(f"Not in the model manifest: {', '.join(unknown)} (known: {', '.join(specs)})")
+    return [specs[crop] for crop in crops] if crops else list(specs.values())
+
+
+def export_tflite_int8(model, output_path, calibration_paths, input_size):
+    """
+    Full-integer post-training quantization. Weights and activations are
+    INT8; the model still takes and returns float32, so it is a drop-in
+    replacement for the float export. Calibration images are preprocessed
+    at the model's input size.
+    """
+    if not calibration_paths:
+        raise SystemExit("INT8 export needs calibration images (see --calibration-dir)")
+
+    def representative_dataset():
+        for path in calibration_paths:
+            img = DecodedImage.from_path(path)
+            if img is not None:
+                yield [img.classifier_input_at(input_size)[None]]
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        export_saved_model(model, export_dir)
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+
+def export_onnx(model, output_path):
+    try:
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("ONNX export needs tf2onnx (pip install tf2onnx onnxruntime)")
+    with tempfile.TemporaryDirectory() as export_dir:
+        export_saved_model(model, export_dir)
+        serving = tf.saved_model.load(export_dir).signatures['serving_default']
+        input_spec = list(serving.structured_input_signature[1].values())
+        tf2onnx.convert.from_function(serving, input_signature=input_spec, opset=13, output_path=output_path)
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx
+}
+
+
+def export_models(backend, crops=None, calibration_paths=None):
+    """Convert each crop model (at its manifest input size); returns {crop: exported_path}"""
+    os.makedirs(settings.EXPORTED_MODELS_PATH, exist_ok=True)
+    if backend == 'tflite_int8':
+        print(f"Calibrating INT8 ranges on {len(calibration_paths or [])} images")
+    exported = {}
+    for spec in model_specs(crops):
+        crop, model_path = spec['crop'], spec['weights']
+        if not os.path.exists(model_path):
+            print(f"  ✗ {crop}: model file not found ({model_path})")
+            continue
+
+        model = load_disease_model(model_path, len(spec['class_names']), spec['input_size'])
+        output_path = exported_model_path(model_path, backend)
+        if backend == 'tflite_int8':
+            export_tflite_int8(model, output_path, calibration_paths, spec['input_size'])
+        else:
+            EXPORTERS[backend](model, output_path)
+        exported[crop] = output_path
+        print(f"  ✓ {crop}: {output_path} ({os.path.getsize(output_path) / (1024 * 1024):.1f} MB)")
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export crop disease models for a CPU runtime")
+    parser.add_argument("--format", choices=sorted(BACKEND_EXTENSIONS), required=True)
+    parser.add_argument("--crops", nargs="*", help="Crops to export (default: all in MODEL_MAP)")
+    parser.add_argument("--calibration-dir", help="INT8 calibration images (default: the upload folder)")
+    parser.add_argument("--calibration-samples", type=int, default=200, help="Images used for INT8 calibration")
+    args = parser.parse_args()
+
+    calibration_paths = None
+    if args.format == 'tflite_int8':
+        calibration_paths = calibration_images(args.calibration_dir, args.calibration_samples)
+    export_models(args.format, args.crops, calibration_paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,186 @@
-from disease_classifier import predict
-from severity_estimator import estimate_severity
-from stage_classifier import classify_stage
-
-MODEL_MAP = {
-    "tomato": "../models/tomato_disease_model.h5",
-    "rice": "../models/rice_disease_model.h5",
-    "wheat": "../models/wheat_disease_model.h5",
-    "cotton": "../models/cotton_disease_model.h5"
-}
-
-CLASS_NAMES = {
-    "tomato": [
-        "Healthy",
-        "Tomato___Bacterial_spot",
-        "Tomato___Early_blight",
-        "Tomato___Late_blight",
-        "Tomato___Leaf_Mold",
-        "Tomato___Septoria_leaf_spot",
-        "Tomato___Spider_mites Two-spotted_spider_mite",
-        "Tomato___Target_Spot",
-        "Tomato___Tomato_Yellow_Leaf_Curl_Virus",
-        "Tomato___Tomato_mosaic_virus"
-    ],
-    "rice": ["Healthy", "BrownSpot", "Hispa", "LeafBlast"],
-    "wheat": ["Healthy", "Brown rust", "Yellow rust", "Loose Smut"],
-    "cotton": ["Healthy", "Bacterial Blight", "Curl Virus", "Leaf Hopper Jassids"]
-}
-
-def full_prediction(image_path, crop):
-    disease, confidence = predict(
-        image_path,
-        MODEL_MAP[crop],
-        CLASS_NAMES[crop]
-    )
-
-    severity = estimate_severity(image_path)
-    stage = classify_stage(severity)
+import numpy as np
 
-    return {
+from disease_classifier import classify, decode_prediction
+from crop_classifier import CROP_IDENTIFIER, get_crop_model, identify_crop
+from severity_estimator import analyze_lesions, analyze_lesions_batch
+from stage_classifier import classify_stage, classify_stages
+from tiled_inference import classify_tiled
+from model_registry import model_registry
+from inference_scheduler import inference_scheduler
+from inference_client import inference_client
+from prediction_cache import prediction_cache, image_key
+from utils.decoded_image import load_image
+from config.settings import settings
+
+class CropNotIdentifiedError(ValueError):
+    """Auto-crop mode could not tell which crop the image shows"""
+
+
+def get_model(crop, record_hit=True):
+    """The crop's model: resident in this process, or a handle on the inference service"""
+    if inference_client.enabled:
+        return inference_client.get(crop)
+    return model_registry.get(crop, record_hit=record_hit)
+
+
+def full_prediction(image, crop=None):
+    """
+    Run the full pipeline on an image path or an already decoded image.
+    With crop=None the crop is identified from the image first.
+    """
+    img = load_image(image)
+    if img is None:
+        raise ValueError(f"Image not found or cannot be read: {image}")
+
+    crop_confidence = None
+    label = None
+    if crop is None:
+        crop, crop_confidence, label = identify_image_crop(img)
+
+    # Models come from the process-wide registry (config/model_manifest.json),
+    # so only the first request for a crop pays the load cost
+    entry = get_model(crop)
+
+    # Re-uploads of the same photo (e.g. after a network failure) return instantly
+    cache_key = None
+    cached = None
+    if prediction_cache.enabled:
+        cache_key = image_key(img, crop, entry.checksum)
+        cached = prediction_cache.get(cache_key)
+
+    if cached is not None:
+        result = cached
+    else:
+        tiles = None
+        if settings.TILED_INFERENCE:
+            # Overlapping tiles of the full image instead of one center crop
+            (disease, confidence), tiles = classify_tiled(img, entry)
+        elif label is not None:
+            # Already scored together with the crop identifier
+            disease, confidence = label
+        elif inference_scheduler.enabled and not inference_client.enabled:
+            # Share a model call with other requests for the same crop
+            probs = inference_scheduler.predict(crop, img.classifier_input_at(entry.input_size))
+            disease, confidence = decode_prediction(probs, entry.class_names)
+        else:
+            disease, confidence = classify(img, entry)
+        print(f"Prediction: {disease} ({confidence:.2f}%)")
+
+        lesions = analyze_lesions(img)
+
+        result = build_result(crop, disease, confidence, lesions['severity_percent'], lesions=lesions, tiles=tiles)
+        if cache_key is not None:
+            prediction_cache.put(cache_key, result)
+
+    if crop_confidence is not None:
+        result['crop_confidence'] = round(crop_confidence, 2)
+    return result
+
+def identify_image_crop(img):
+    """
+    Auto-crop mode: (crop, crop_confidence, (disease, confidence) or None).
+    The identified crop is cached per image, so a re-upload goes straight
+    to the regular (cached) prediction.
+    """
+    crop_key = None
+    if prediction_cache.enabled:
+        crop_key = image_key(img, CROP_IDENTIFIER, get_crop_model().checksum)
+        cached = prediction_cache.get(crop_key)
+        if cached is not None:
+            return cached['crop'], cached['crop_confidence'], None
+
+    crop, crop_confidence, label = identify_crop(img)
+    print(f"Identified crop: {crop} ({crop_confidence:.2f}%)")
+    if crop_confidence < settings.AUTO_CROP_MIN_CONFIDENCE or crop not in model_registry.crops():
+        raise CropNotIdentifiedError("Could not identify the crop in this image. Please select the crop.")
+
+    if crop_key is not None:
+        prediction_cache.put(crop_key, {'crop': crop, 'crop_confidence': crop_confidence})
+    return crop, crop_confidence, label
+
+def full_prediction_batch(images, crop):
+    """
+    Run the full pipeline over many decoded images of one crop.
+    All images go through the model in a single batched call.
+    """
+    results = [None] * len(images)
+    keys = [None] * len(images)
+
+    if prediction_cache.enabled and images:
+        checksum = get_model(crop, record_hit=False).checksum
+        for i, img in enumerate(images):
+            keys[i] = image_key(img, crop, checksum)
+            results[i] = prediction_cache.get(keys[i])
+
+    todo = [i for i, r in enumerate(results) if r is None]
+    if settings.TILED_INFERENCE:
+        # One model call per image: its tiles already make a batch
+        entry = get_model(crop)
+        labels, tiles = zip(*[classify_tiled(images[i], entry) for i in todo]) if todo else ((), ())
+    else:
+        input_size = get_model(crop, record_hit=False).input_size if todo else None
+        labels = classify_batch([images[i].classifier_input_at(input_size) for i in todo], crop)
+        tiles = [None] * len(todo)
+    # Lesion statistics for every image, then all stages in one vectorized pass
+    lesions = analyze_lesions_batch([images[i] for i in todo])
+    stages = classify_stages([stats['severity_percent'] for stats in lesions])
+    for i, (disease, confidence), stats, stage, grid in zip(todo, labels, lesions, stages, tiles):
+        results[i] = build_result(crop, disease, confidence, stats['severity_percent'], stage, stats, grid)
+        if keys[i] is not None:
+            prediction_cache.put(keys[i], results[i])
+    return results
+
+def classify_batch(tensors, crop):
+    """
+    Classify preprocessed tensors (at the model's input size) in one model call.
+    Returns a list of (disease_name, confidence_percent).
+    """
+    entry = get_model(crop)
+    if len(tensors) == 0:
+        return []
+
+    preds = entry.predict(np.stack(tensors))
+    return [decode_prediction(probs, entry.class_names) for probs in preds]
+
+def build_result(crop, disease, confidence, severity, stage=None, lesions=None, tiles=None):
+    result = {
         "crop": crop,
         "disease": disease,
-        "confidence": round(confidence, 2),
-        "severity_percent": severity,
-        "stage": stage
+        "confidence": round(float(confidence), 2),
+        "severity_percent": float(severity),
+        "stage": stage or classify_stage(severity)
+    }
+    if lesions is not None:
+        # Lesion count, size distribution and leaf coverage (see severity_estimator)
+        result["lesions"] = {k: v for k, v in lesions.items() if k != "severity_percent"}
+    if tiles is not None:
+        # Tile grid and disease heatmap of tiled inference (see tiled_inference)
+        result["tiles"] = tiles
+    return result
+
+def summarize_batch(results):
+    """
+    Field-level summary over per-image predictions from one visit
+    """
+    if not results:
+        return {"images_diagnosed": 0}
+
+    disease_counts = {}
+    stage_counts = {}
+    for r in results:
+        disease_counts[r["disease"]] = disease_counts.get(r["disease"], 0) + 1
+        stage_counts[r["stage"]] = stage_counts.get(r["stage"], 0) + 1
+
+    severities = [float(r["severity_percent"]) for r in results]
+    healthy = sum(1 for r in results if r["disease"] == "Healthy")
+    diseased = {d: c for d, c in disease_counts.items() if d != "Healthy"}
+
+    return {
+        "images_diagnosed": len(results),
+        "healthy_percent": round(healthy / len(results) * 100, 2),
+        "disease_counts": disease_counts,
+        "stage_counts": stage_counts,
+        "dominant_disease": max(diseased, key=diseased.get) if diseased else "Healthy",
+        "mean_severity_percent": round(sum(severities) / len(severities), 2),
+        "max_severity_percent": round(max(severities), 2)
     }
@@ -0,0 +1,220 @@
+"""
+Thin client for the out-of-process inference service (inference_service.py).
+
+With INFERENCE_SERVICE_ADDRESS set, the web process never loads a model:
+final_predictor gets a RemoteModel from here instead of a registry entry,
+and each predict() is one round trip to the service. On the same host the
+input tensor is handed over through shared memory; to a remote host it is
+sent inline over the connection.
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError, shared_memory
+from multiprocessing.connection import Client
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from utils.metrics import Histogram
+
+LATENCY_MS_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000]
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+# Errors raised inside the service that keep their type on this side
+_REMOTE_ERRORS = {'ValueError': ValueError, 'FileNotFoundError': FileNotFoundError}
+
+
+class InferenceServiceError(RuntimeError):
+    """The inference service is unreachable, timed out or failed"""
+
+
+def parse_address(address):
+    """'host:port' -> (host, port)"""
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Inference service address must be host:port, got '{address}'")
+    return host, int(port)
+
+
+class _PendingCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RemoteModel:
+    """Stands in for a ModelEntry whose model lives in the inference service"""
+
+    shared_backbone = False
+
+    def __init__(self, client, key, info):
+        self.client = client
+        self.crop = key
+        self.class_names = info['class_names']
+        self.checksum = info['checksum']
+        self.backend = info['backend']
+        self.input_size = info['input_size']
+        self.version = info['version']
+
+    def predict(self, batch):
+        """Run the model on a (N, input_size, input_size, 3) float32 batch"""
+        return self.client.predict(self.crop, batch)
+
+
+class InferenceClient:
+    """
+    One connection to the inference service, shared by all request threads.
+
+    Calls are tagged with an id and may be in flight concurrently; a reader
+    thread hands each reply to the thread waiting for it. A lost connection
+    fails the calls in flight and is re-opened by the next call.
+    """
+
+    def __init__(self, address, authkey, timeout):
+        self.address = parse_address(address) if address else None
+        self.authkey = authkey.encode('utf-8')
+        self.timeout = timeout
+        # Shared memory only works when the service runs on this host
+        self.shared_memory = bool(self.address) and self.address[0] in LOCAL_HOSTS
+        self.latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._conn = None
+        self._ids = itertools.count()
+        self._pending = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.address is not None
+
+    def get(self, key):
+        """The service's model for a crop (or the crop identifier), as a RemoteModel"""
+        model = self._models.get(key)
+        if model is None:
+            model = RemoteModel(self, key, self._call('info', key, None))
+            self._models[key] = model
+        return model
+
+    def predict(self, key, batch, timeout=None):
+        """Score a (N, 224, 224, 3) batch with the service's model for key"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if not self.shared_memory:
+            return self._call('predict', key, batch, timeout)
+
+        shm = shared_memory.SharedMemory(create=True, size=batch.nbytes)
+        try:
+            np.ndarray(batch.shape, dtype=np.float32, buffer=shm.buf)[:] = batch
+            return self._call('predict', key, ('shm', shm.name, batch.shape), timeout)
+        finally:
+            # The service has detached by the time it replies (or we gave up waiting)
+            shm.close()
+            shm.unlink()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'address': f"{self.address[0]}:{self.address[1]}" if self.address else None,
+            'connected': self._conn is not None,
+            'shared_memory': self.shared_memory,
+            'timeout_seconds': self.timeout,
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'in_flight': len(self._pending),
+            'latency_ms': self.latency_ms.snapshot()
+        }
+
+    def _call(self, op, key, payload, timeout=None):
+        if not self.authkey:
+            raise InferenceServiceError("INFERENCE_SERVICE_AUTHKEY is not set")
+        call_id = next(self._ids)
+        call = _PendingCall()
+        started = time.perf_counter()
+        self.calls += 1
+
+        with self._lock:
+            self._pending[call_id] = call
+        conn = None
+        try:
+            conn = self._connection()
+            with self._send_lock:
+                conn.send((call_id, op, key, payload))
+        except (OSError, EOFError, AuthenticationError) as e:
+            self._drop_connection(conn, e)
+            with self._lock:
+                self._pending.pop(call_id, None)
+            self.errors += 1
+            raise InferenceServiceError(f"Inference service unavailable: {e}")
+
+        if not call.done.wait(timeout or self.timeout):
+            with self._lock:
+                self._pending.pop(call_id, None)
+            self.timeouts += 1
+            raise InferenceServiceError(f"Inference service timed out ({op} {key})")
+
+        self.latency_ms.observe((time.perf_counter() - started) * 1000)
+        if call.error is not None:
+            self.errors += 1
+            raise call.error
+        return call.result
+
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = Client(self.address, authkey=self.authkey)
+                # A restarted service may serve other model versions
+                self._models = {}
+                threading.Thread(
+                    target=self._read, args=(self._conn,), name='inference-client', daemon=True
+                ).start()
+            return self._conn
+
+    def _read(self, conn):
+        try:
+            while True:
+                call_id, ok, value = conn.recv()
+                with self._lock:
+                    call = self._pending.pop(call_id, None)
+                if call is None:
+                    continue  # The caller timed out
+                if ok:
+                    call.result = value
+                else:
+                    error_type, message = value
+                    call.error = _REMOTE_ERRORS.get(error_type, InferenceServiceError)(message)
+                call.done.set()
+        except (OSError, EOFError) as e:
+            self._drop_connection(conn, e)
+
+    def _drop_connection(self, conn, error):
+        with self._lock:
+            if conn is None or conn is not self._conn:
+                return
+            self._conn = None
+            pending, self._pending = self._pending, {}
+        try:
+            conn.close()
+        except OSError:
+            pass
+        print(f"DEBUG: Lost connection to the inference service: {error}")
+        for call in pending.values():
+            call.error = InferenceServiceError(f"Inference service connection lost: {error}")
+            call.done.set()
+
+
+# Global client instance (disabled unless INFERENCE_SERVICE_ADDRESS is set)
+inference_client = InferenceClient(
+    settings.INFERENCE_SERVICE_ADDRESS,
+    settings.INFERENCE_SERVICE_AUTHKEY,
+    settings.INFERENCE_SERVICE_TIMEOUT
+)
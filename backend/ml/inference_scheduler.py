@@ -0,0 +1,142 @@
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from utils.metrics import Histogram
+from model_registry import model_registry
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_MS_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000]
+
+
+class _PendingRequest:
+    """One caller's image waiting to be batched"""
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects single-image requests for one crop and runs them through the
+    model as one batch.
+
+    A batch is dispatched when max_batch_size images are waiting or when the
+    oldest waiting image has been queued for window_ms, whichever is first.
+    """
+
+    def __init__(self, crop, window_ms, max_batch_size):
+        self.crop = crop
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"microbatch-{crop}", daemon=True
+        )
+        self._thread.start()
+
+    def predict(self, tensor, timeout=None):
+        """Queue one (H, W, 3) tensor and block until its probabilities are ready"""
+        request = _PendingRequest(tensor)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"Inference for {self.crop} timed out")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            # Once the window has closed, still take anything already waiting
+            # (requests that queued up while the previous batch was running)
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for request in batch:
+                self.queue_wait_ms.observe((started - request.enqueued_at) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            try:
+                entry = model_registry.get(self.crop, record_hit=False)
+                preds = entry.predict(np.stack([r.tensor for r in batch]))
+                for request, row in zip(batch, preds):
+                    request.result = row
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot()
+        }
+
+
+class InferenceScheduler:
+    """One micro-batching queue per crop, created on first use"""
+
+    def __init__(self, window_ms, max_batch_size):
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self._batchers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.window_ms > 0 and self.max_batch_size > 1
+
+    def predict(self, crop, tensor, timeout=None):
+        batcher = self._batchers.get(crop)
+        if batcher is None:
+            with self._lock:
+                batcher = self._batchers.get(crop)
+                if batcher is None:
+                    batcher = MicroBatcher(crop, self.window_ms, self.max_batch_size)
+                    self._batchers[crop] = batcher
+        return batcher.predict(tensor, timeout)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'window_ms': self.window_ms,
+            'max_batch_size': self.max_batch_size,
+            'crops': {crop: b.stats() for crop, b in self._batchers.items()}
+        }
+
+
+# Global scheduler instance
+inference_scheduler = InferenceScheduler(
+    settings.MICRO_BATCH_WINDOW_MS,
+    settings.MICRO_BATCH_MAX_SIZE
+)
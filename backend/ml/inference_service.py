@@ -0,0 +1,284 @@
+"""
+Out-of-process inference service.
+
+A pool of worker processes owns the crop models; web processes reach them
+through inference_client.py (set INFERENCE_SERVICE_ADDRESS). TensorFlow
+then never runs inside Flask request threads, the model copies no longer
+multiply with the number of web workers, and web and inference capacity
+are sized independently (--workers here, any number of web processes).
+
+The service process itself only routes messages: each call from a client
+connection is queued, the first idle worker runs it, and the reply goes
+back on the same connection. Input tensors from clients on this host
+arrive in shared memory and are read in place, without pickling.
+
+Connections carry pickled messages, so INFERENCE_SERVICE_AUTHKEY is
+required and whoever holds it can run code in the service. The default
+Flask secret is only accepted on a loopback address. A worker that does
+not answer a call within INFERENCE_SERVICE_TIMEOUT is killed and restarted.
+
+Examples:
+    INFERENCE_SERVICE_AUTHKEY=... python inference_service.py --workers 2
+    INFERENCE_SERVICE_AUTHKEY=<long random secret> python inference_service.py --address 10.0.0.5:6100 --workers 4
+"""
+import argparse
+import ipaddress
+import itertools
+import multiprocessing
+import os
+import sys
+import queue
+import signal
+import threading
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+# Only light imports here: spawned workers re-import this module, and the
+# routing process never needs TensorFlow
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from inference_client import LOCAL_HOSTS, parse_address
+
+# Secrets that ship in the repository (settings defaults); never valid off loopback
+DEFAULT_AUTHKEYS = {settings.DEFAULT_SECRET_KEY, 'jwt-secret-key-change-in-production'}
+
+
+def attach_shared_memory(name):
+    """Open a client's segment without registering it for cleanup here (the client unlinks it)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _get_model(key):
+    from crop_classifier import CROP_IDENTIFIER, get_crop_model
+    from model_registry import model_registry
+
+    if key == CROP_IDENTIFIER:
+        return get_crop_model()
+    return model_registry.get(key)
+
+
+def _predict(key, payload):
+    entry = _get_model(key)
+    if not isinstance(payload, tuple):
+        return entry.predict(payload)
+
+    _, name, shape = payload
+    shm = attach_shared_memory(name)
+    try:
+        batch = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        probs = entry.predict(batch)
+        del batch  # The segment can't be closed while a view on it exists
+        return probs
+    finally:
+        shm.close()
+
+
+def _handle(op, key, payload):
+    if op == 'predict':
+        return _predict(key, payload)
+    if op == 'info':
+        entry = _get_model(key)
+        return {'class_names': entry.class_names, 'checksum': entry.checksum, 'backend': entry.backend,
+                'input_size': entry.input_size, 'version': entry.version}
+    raise ValueError(f"Unknown inference service operation: {op}")
+
+
+def worker_main(worker_id, conn):
+    """Worker process: load every model up front, then run calls until told to stop"""
+    from model_registry import model_registry
+    from crop_classifier import auto_crop_available, get_crop_model
+
+    model_registry.preload()
+    if auto_crop_available():
+        get_crop_model()
+    print(f"DEBUG: Inference worker {worker_id} ready (pid {os.getpid()})")
+    conn.send(None)  # Ready: calls are timed from here on
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break  # Service went away
+        if task is None:
+            break
+        try:
+            conn.send((True, _handle(*task)))
+        except Exception as e:
+            conn.send((False, (type(e).__name__, str(e))))
+
+
+class InferenceService:
+    """
+    Accepts client connections and routes their calls through the worker pool.
+
+    Each worker has its own pipe and a feeder thread here that hands it the
+    next queued call once the previous one is answered, so calls go to
+    whichever worker is idle. A worker that dies (e.g. killed for memory)
+    fails only the call it was running and is replaced, as is one that does
+    not answer within call_timeout seconds.
+    """
+
+    def __init__(self, address, authkey, num_workers, call_timeout=settings.INFERENCE_SERVICE_TIMEOUT):
+        self.address = address
+        self.authkey = authkey.encode('utf-8')
+        self.num_workers = num_workers
+        self.call_timeout = call_timeout
+        # Spawned, not forked: workers must not inherit this process's threads
+        self._context = multiprocessing.get_context('spawn')
+        self._tasks = queue.Queue()
+        self._feeders = []
+        self._connections = {}  # conn_id -> (connection, send lock)
+        self._conn_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        for worker_id in range(self.num_workers):
+            feeder = threading.Thread(
+                target=self._feed_worker, args=(worker_id,), name=f"inference-feeder-{worker_id}", daemon=True
+            )
+            feeder.start()
+            self._feeders.append(feeder)
+
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Inference service listening on {self.address[0]}:{self.address[1]} "
+                  f"with {self.num_workers} workers")
+            try:
+                while True:
+                    try:
+                        conn = listener.accept()
+                    except (OSError, AuthenticationError) as e:
+                        print(f"DEBUG: Rejected inference client: {e}")
+                        continue
+                    threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+            finally:
+                self.stop()
+
+    def stop(self):
+        for _ in self._feeders:
+            self._tasks.put(None)
+        for feeder in self._feeders:
+            feeder.join(timeout=10)
+
+    def _start_worker(self, worker_id):
+        conn, worker_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=worker_main, args=(worker_id, worker_conn), name=f"inference-worker-{worker_id}", daemon=True
+        )
+        process.start()
+        worker_conn.close()
+        try:
+            conn.recv()  # Models loaded (however long that takes)
+        except (OSError, EOFError):
+            print(f"DEBUG: Inference worker {worker_id} failed to start ({process.exitcode})")
+        return process, conn
+
+    def _feed_worker(self, worker_id):
+        process, conn = self._start_worker(worker_id)
+        for task in iter(self._tasks.get, None):
+            conn_id, call_id, op, key, payload = task
+            if not process.is_alive():
+                print(f"DEBUG: Inference worker {worker_id} exited ({process.exitcode}), restarting")
+                conn.close()
+                process, conn = self._start_worker(worker_id)
+            try:
+                conn.send((op, key, payload))
+                if conn.poll(self.call_timeout):
+                    ok, value = conn.recv()
+                else:
+                    # Hung (or far too slow): the client has given up by now, and
+                    # the queue behind this worker must not wait on it forever
+                    print(f"DEBUG: Inference worker {worker_id} timed out on {op} {key}, killing it")
+                    process.kill()
+                    process.join(timeout=5)
+                    ok, value = False, ('InferenceServiceError', f"Inference worker {worker_id} timed out")
+            except (OSError, EOFError):
+                # Died mid-call; the next task restarts it
+                ok, value = False, ('InferenceServiceError', f"Inference worker {worker_id} died")
+            self._reply(conn_id, (call_id, ok, value))
+
+        try:
+            conn.send(None)
+        except OSError:
+            pass
+        process.join(timeout=5)
+
+    def _serve_connection(self, conn):
+        conn_id = next(self._conn_ids)
+        with self._lock:
+            self._connections[conn_id] = (conn, threading.Lock())
+        try:
+            while True:
+                self._tasks.put((conn_id, *conn.recv()))
+        except (OSError, EOFError):
+            pass  # Client went away; replies still pending for it are dropped
+        finally:
+            with self._lock:
+                self._connections.pop(conn_id, None)
+            conn.close()
+
+    def _reply(self, conn_id, reply):
+        with self._lock:
+            target = self._connections.get(conn_id)
+        if target is None:
+            return
+        conn, send_lock = target
+        try:
+            with send_lock:
+                conn.send(reply)
+        except OSError:
+            pass
+
+
+def is_loopback(host):
+    if host in LOCAL_HOSTS:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # A host name
+
+
+def check_authkey(host, authkey):
+    """Why the service must not listen on host with this authkey, or None if it may"""
+    if not authkey:
+        return "INFERENCE_SERVICE_AUTHKEY is not set"
+    if authkey in DEFAULT_AUTHKEYS and not is_loopback(host):
+        return f"INFERENCE_SERVICE_AUTHKEY is a default secret; refusing to listen on {host}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the out-of-process inference service")
+    parser.add_argument("--address", default=settings.INFERENCE_SERVICE_ADDRESS or '127.0.0.1:6100',
+                        help="host:port to listen on (default: INFERENCE_SERVICE_ADDRESS)")
+    parser.add_argument("--workers", type=int, default=settings.INFERENCE_SERVICE_WORKERS,
+                        help="Worker processes, each with its own copy of the models")
+    parser.add_argument("--timeout", type=float, default=settings.INFERENCE_SERVICE_TIMEOUT,
+                        help="Seconds a worker may take per call before it is restarted")
+    args = parser.parse_args()
+
+    address = parse_address(args.address)
+    problem = check_authkey(address[0], settings.INFERENCE_SERVICE_AUTHKEY)
+    if problem:
+        print(f"✗ {problem}")
+        sys.exit(1)
+
+    # Exit through serve_forever's cleanup so the workers are stopped too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    service = InferenceService(address, settings.INFERENCE_SERVICE_AUTHKEY, args.workers, args.timeout)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\nInference service stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import gc
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Make the backend package (config, utils) importable when running from ml/
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from disease_classifier import CompiledModel, load_disease_model, split_backbone, weights_fingerprint
+from shared_backbone import CropHead, SharedBackbone, apply_heads
+from runtime_backends import exported_model_path, fork_safe_runtime, load_runtime_model
+from utils.decoded_image import CLASSIFIER_INPUT_SIZE
+
+EVENT_LOG_SIZE = 100  # Most recent load/evict events kept for stats()
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """SHA-256 of a weights file, used as the model version"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelEntry:
+    """A loaded crop model together with its bookkeeping"""
+
+    def __init__(self, crop, model_path, class_names, model, load_seconds,
+                 input_size=CLASSIFIER_INPUT_SIZE, version=None):
+        self.crop = crop
+        self.model_path = model_path
+        self.class_names = class_names
+        self.model = model
+        self.load_seconds = load_seconds
+        self.input_size = input_size
+        self.version = version
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+        # Runtime (TFLite/ONNX) models report their own size
+        self.memory_bytes = getattr(model, 'memory_bytes', None) or sum(w.nbytes for w in model.get_weights())
+        self.checksum = file_checksum(model_path)
+        self.shared_backbone = isinstance(model, CropHead)
+        self.backend = getattr(model, 'backend', 'keras')
+
+    def predict(self, batch):
+        """Run the model on a (N, input_size, input_size, 3) float32 batch"""
+        return self.model.predict(batch, verbose=0)
+
+    def stats(self):
+        return {
+            'model_path': self.model_path,
+            'version': self.version,
+            'input_size': self.input_size,
+            'backend': self.backend,
+            'checksum': self.checksum[:12],
+            'num_classes': len(self.class_names),
+            'load_seconds': round(self.load_seconds, 3),
+            'loaded_at': self.loaded_at,
+            'last_used': self.last_used,
+            'hits': self.hits,
+            'shared_backbone': self.shared_backbone,
+            'memory_mb': round(self.memory_bytes / (1024 * 1024), 2)
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of disease models, one per crop in the model manifest.
+
+    Each model is built and its weights read from disk only on first use;
+    every later request for the same crop reuses the resident model. With a
+    memory budget, loading a crop that doesn't fit evicts the least recently
+    used ones, so a node can serve more crops than it can hold at once.
+
+    With shared_backbone, crops whose models have the same (frozen) backbone
+    keep one copy of it and only their Dense heads; predict_all() then
+    scores every crop with a single backbone pass.
+    """
+
+    def __init__(self, manifest, shared_backbone=False, backend='keras', num_threads=0,
+                 quantized_crops=(), memory_budget_mb=0, batch_buckets=(), warm_buckets=(1,)):
+        self.manifest = {m['crop']: m for m in manifest}
+        self.model_map = {crop: m['weights'] for crop, m in self.manifest.items()}
+        self.class_names = {crop: m['class_names'] for crop, m in self.manifest.items()}
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.shared_backbone = shared_backbone
+        self.backend = backend
+        self.num_threads = num_threads
+        self.quantized_crops = set(quantized_crops)
+        self.batch_buckets = tuple(batch_buckets)
+        self.warm_buckets = tuple(warm_buckets)
+        self._backbone = None
+        self._entries = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+        self._crop_locks = {}
+        self.loads = 0
+        self.evictions = 0
+        self.events = deque(maxlen=EVENT_LOG_SIZE)
+
+    def crops(self):
+        """Crops that have a model configured"""
+        return list(self.model_map.keys())
+
+    def backend_for(self, key):
+        """Runtime backend for a crop: its INT8 variant if selected, else the default"""
+        return 'tflite_int8' if key in self.quantized_crops else self.backend
+
+    def fork_safe(self, keys=None):
+        """
+        Whether the models for these crops (default: all) can be loaded before
+        fork() and used by the children: TensorFlow's runtime does not survive
+        a fork, so this holds only when none of them would load through Keras
+        or through TensorFlow's own TFLite interpreter.
+        """
+        for key in keys or self.crops():
+            model_path = self.model_map.get(key, key)
+            backend = self.backend_for(key)
+            if backend == 'keras' or not fork_safe_runtime(backend):
+                return False
+            if not os.path.exists(exported_model_path(model_path, backend)):
+                return False
+        return True
+
+    def is_loaded(self, crop):
+        return crop in self._entries
+
+    def get(self, crop, record_hit=True):
+        """Get the resident model for a crop, loading it on first use"""
+        entry = self._touch(crop)
+        if entry is None:
+            spec = self.manifest.get(crop)
+            if spec is None:
+                raise ValueError(f"No model configured for crop: {crop}")
+            entry = self._load(crop, spec['weights'], spec['class_names'], spec['input_size'], spec['version'])
+        if record_hit:
+            entry.hits += 1
+        return entry
+
+    def get_for_path(self, model_path, class_names):
+        """Get a model by weights path (used by the standalone predict helper)"""
+        for crop, path in self.model_map.items():
+            if os.path.abspath(path) == os.path.abspath(model_path):
+                return self.get(crop)
+
+        entry = self._touch(model_path)
+        if entry is None:
+            entry = self._load(model_path, model_path, class_names)
+        entry.hits += 1
+        return entry
+
+    def preload(self, crops=None):
+        """Eagerly load models (e.g. at startup) so no request pays the load cost"""
+        evictions = self.evictions
+        for crop in crops or self.crops():
+            try:
+                self.get(crop, record_hit=False)
+            except Exception as e:
+                print(f"DEBUG: Could not preload model for {crop}: {e}")
+            if self.evictions > evictions:
+                # Full: preloading further would only evict what was just loaded
+                print("DEBUG: Model memory budget reached, the remaining crops load on first use")
+                break
+
+    def predict_all(self, batch, crops=None):
+        """
+        Score a (N, 224, 224, 3) batch against several crops (default: all).
+
+        Crops on the shared backbone cost one backbone pass in total plus a
+        single matrix multiply for all their heads; any others run their
+        own full model. Returns a dict of crop -> (N, num_classes) probs.
+        """
+        return self.predict_entries(batch, {crop: self.get(crop) for crop in crops or self.crops()})
+
+    def predict_entries(self, batch, entries):
+        """Like predict_all, for any named entries (e.g. disease models plus the crop identifier)"""
+        heads = {name: e.model for name, e in entries.items() if e.shared_backbone}
+
+        probs = {}
+        if heads:
+            probs.update(apply_heads(self._backbone.features(batch), heads))
+        for name, entry in entries.items():
+            if name not in heads:
+                probs[name] = entry.predict(batch)
+        return probs
+
+    def stats(self):
+        """Per-model load time, hit count and memory footprint, plus recent load/evict events"""
+        with self._lock:
+            entries = list(self._entries.items())
+            events = list(self.events)
+        return {
+            'configured_crops': self.crops(),
+            'loaded': {key: entry.stats() for key, entry in entries},
+            'shared_backbone': self._backbone.stats() if self._backbone else None,
+            'total_memory_mb': round(self._resident_bytes() / (1024 * 1024), 2),
+            'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 2) if self.memory_budget else None,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'events': events
+        }
+
+    def _touch(self, key):
+        """The resident entry for key (marked most recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_used = time.time()
+        return entry
+
+    def _resident_bytes(self):
+        backbone_bytes = self._backbone.memory_bytes if self._backbone else 0
+        return backbone_bytes + sum(e.memory_bytes for e in list(self._entries.values()))
+
+    def _record(self, event, entry, **details):
+        self.events.append({
+            'event': event,
+            'key': entry.crop,
+            'at': time.time(),
+            'memory_mb': round(entry.memory_bytes / (1024 * 1024), 2),
+            'resident_mb': round(self._resident_bytes() / (1024 * 1024), 2),
+            **details
+        })
+
+    def _evict_over_budget(self, keep):
+        if self.memory_budget and self._evict_lru(keep):
+            # Keras models hold reference cycles; release the evicted ones' memory now
+            gc.collect()
+
+    def _evict_lru(self, keep):
+        """Drop least recently used models until the resident ones fit the budget; returns how many"""
+        evicted = 0
+        with self._lock:
+            while self._resident_bytes() > self.memory_budget:
+                victim = next((key for key in self._entries if key != keep), None)
+                if victim is None:
+                    break  # Only the model just loaded is left; it stays even if over budget
+                entry = self._entries.pop(victim)
+                idle_seconds = time.time() - entry.last_used
+                self.evictions += 1
+                evicted += 1
+                self._record('evict', entry, idle_seconds=round(idle_seconds, 1))
+                print(f"DEBUG: Evicted model for {victim} ({entry.memory_bytes / (1024 * 1024):.1f} MB, "
+                      f"idle {idle_seconds:.0f}s) to stay within the memory budget")
+        return evicted
+
+    def _load(self, key, model_path, class_names, input_size=CLASSIFIER_INPUT_SIZE, version=None):
+        # One lock per key so two crops can load in parallel, but the same
+        # crop is never built twice by concurrent requests
+        with self._lock:
+            key_lock = self._crop_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+
+            if not class_names:
+                raise ValueError("class_names cannot be empty")
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model file not found: {model_path}")
+
+            start = time.perf_counter()
+            model = None
+            backend = self.backend_for(key)
+            if backend != 'keras':
+                # Exported copy for a lighter CPU runtime; its checksum versions the entry
+                model, exported_path = self._load_runtime(model_path, backend)
+                if model is not None:
+                    model_path = exported_path
+            if model is None:
+                model = load_disease_model(model_path, len(class_names), input_size)
+                # The shared backbone runs on the common 224 classifier input only
+                if self.shared_backbone and input_size == CLASSIFIER_INPUT_SIZE:
+                    model = self._share_backbone(key, model_path, model)
+                if not isinstance(model, CropHead):
+                    model = self._compile(model, input_size)
+            load_seconds = time.perf_counter() - start
+
+            entry = ModelEntry(key, model_path, class_names, model, load_seconds, input_size, version)
+            with self._lock:
+                self._entries[key] = entry
+                self.loads += 1
+                self._record('load', entry, load_seconds=round(load_seconds, 3))
+            print(f"DEBUG: Loaded model for {key} in {load_seconds:.2f}s "
+                  f"({entry.memory_bytes / (1024 * 1024):.1f} MB)")
+
+        self._evict_over_budget(keep=key)
+        return entry
+
+    def _load_runtime(self, model_path, backend):
+        try:
+            model, exported_path = load_runtime_model(model_path, backend, self.num_threads)
+        except ImportError as e:
+            print(f"DEBUG: {backend} runtime unavailable ({e}), using Keras")
+            return None, None
+        if model is None:
+            print(f"DEBUG: No {backend} export of {model_path}, using Keras (run export_models.py)")
+        return model, exported_path
+
+    def _compile(self, model, input_size):
+        """Wrap a Keras model in fixed-signature graph functions (warm_buckets traced here, at load)"""
+        if not self.batch_buckets:
+            return model
+        return CompiledModel(model, input_size, self.batch_buckets, self.warm_buckets)
+
+    def _share_backbone(self, key, model_path, model):
+        """Swap a full model for a head on the shared backbone, if the backbones match"""
+        split = split_backbone(model)
+        if split is None:
+            print(f"DEBUG: {key} is not a MobileNetV2 classifier, keeping its full model")
+            return model
+        extractor, kernel, bias = split
+        fingerprint = weights_fingerprint(extractor)
+        if self._backbone is None:
+            # Traced outside the registry lock, which get() takes on every call
+            backbone = SharedBackbone(self._compile(extractor, CLASSIFIER_INPUT_SIZE), fingerprint, model_path)
+            with self._lock:
+                if self._backbone is None:
+                    self._backbone = backbone
+
+        if fingerprint != self._backbone.fingerprint:
+            # Fine-tuned backbone: it can't share, so keep the whole model
+            print(f"DEBUG: Backbone of {key} differs from the shared one, keeping its full model")
+            return model
+        # The rest of this crop's model (its own backbone copy) is released here
+        return CropHead(self._backbone, kernel, bias)
+
+
+# Global registry instance
+model_registry = ModelRegistry(
+    settings.MODEL_MANIFEST,
+    shared_backbone=settings.SHARED_BACKBONE,
+    backend=settings.INFERENCE_BACKEND,
+    num_threads=settings.INFERENCE_THREADS,
+    quantized_crops=settings.QUANTIZED_CROPS,
+    memory_budget_mb=settings.MODEL_MEMORY_BUDGET_MB,
+    batch_buckets=settings.INFERENCE_BATCH_BUCKETS,
+    warm_buckets=settings.INFERENCE_WARM_BUCKETS
+)
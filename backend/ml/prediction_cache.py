@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+
+# Bumped whenever the pipeline's output for the same image and model changes
+# (e.g. how severity is measured), so persisted results from before are not served
+RESULT_VERSION = 3
+
+
+def image_key(img, crop, model_checksum):
+    """
+    Content address for a prediction.
+
+    The pipeline output depends only on the 224 classifier crop and the 256
+    severity view, so hashing those (instead of the full-resolution pixels)
+    identifies duplicate uploads exactly at a fraction of the cost.
+    """
+    digest = hashlib.sha256()
+    digest.update(img.classifier_crop.tobytes())
+    digest.update(img.resized_256.tobytes())
+    if settings.TILED_INFERENCE:
+        # Tiled predictions also depend on the resolution the tiles are cut from
+        digest.update(f"tiled:{settings.TILED_INFERENCE_SIDE}:{settings.TILE_OVERLAP}:"
+                      f"{settings.MAX_TILES_PER_IMAGE}:{img.width}x{img.height}".encode())
+    return f"{crop}:{model_checksum}:v{RESULT_VERSION}:{digest.hexdigest()}"
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of pipeline results, with an optional SQLite tier that
+    survives restarts and is shared between worker processes.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.db_path = db_path
+        self._entries = OrderedDict()  # key -> (result, expires_at)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        if db_path:
+            self._init_db()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                result, expires_at = item
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return dict(result)
+                del self._entries[key]
+
+        result = self._db_get(key, now) if self.db_path else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.persistent_hits += 1
+        self._remember(key, result, now + self.ttl)
+        return dict(result)
+
+    def put(self, key, result):
+        expires_at = time.time() + self.ttl
+        self._remember(key, dict(result), expires_at)
+        if self.db_path:
+            self._db_put(key, result, expires_at)
+
+    def _remember(self, key, result, expires_at):
+        with self._lock:
+            self._entries[key] = (result, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'persistent': bool(self.db_path),
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_rate': round((lookups - self.misses) / lookups, 3) if lookups else 0.0
+        }
+
+    # --- SQLite tier ---
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_prediction_cache_expires ON prediction_cache(expires_at)'
+            )
+
+    def _db_get(self, key, now):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT result FROM prediction_cache WHERE cache_key = ? AND expires_at > ?',
+                    (key, now)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except sqlite3.Error as e:
+            print(f"DEBUG: Prediction cache read failed: {e}")
+            return None
+
+    def _db_put(self, key, result, expires_at):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO prediction_cache (cache_key, result, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(result), expires_at)
+                )
+                conn.execute('DELETE FROM prediction_cache WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error as e:
+            print(f"DEBUG: Prediction cache write failed: {e}")
+
+
+# Global cache instance
+prediction_cache = PredictionCache(
+    settings.PREDICTION_CACHE_SIZE,
+    settings.PREDICTION_CACHE_TTL,
+    settings.PREDICTION_CACHE_DB or None
+)
@@ -0,0 +1,140 @@
+"""
+Lightweight CPU runtimes for exported disease models (see export_models.py).
+
+Each runtime model exposes predict(batch) like the Keras model it replaces,
+so the model registry, micro-batcher and classify() use it unchanged.
+"""
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+
+
+def _module_available(name):
+    if name in sys.modules:
+        return True  # Possibly a lazy module; find_spec would force its import
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False  # Parent package missing
+
+
+# Prefer the standalone interpreters; full TensorFlow also ships one.
+# Only looked up here - importing them is deferred until a model is loaded
+TFLITE_MODULES = ['ai_edge_litert.interpreter', 'tflite_runtime.interpreter', 'tensorflow']
+ONNX_AVAILABLE = _module_available('onnxruntime')
+
+
+def _tflite_module():
+    """The module TFLite models are loaded with, or None"""
+    return next((name for name in TFLITE_MODULES if _module_available(name)), None)
+
+
+def _tflite_interpreter_class():
+    name = _tflite_module()
+    if name is None:
+        raise ImportError("No TFLite interpreter installed (ai-edge-litert, tflite-runtime or tensorflow)")
+    module = importlib.import_module(name)
+    return module.lite.Interpreter if name == 'tensorflow' else module.Interpreter
+
+
+BACKEND_EXTENSIONS = {
+    'tflite': '.tflite',
+    'tflite_int8': '.int8.tflite',  # Post-training quantized (export_models.py --format tflite_int8)
+    'onnx': '.onnx'
+}
+
+
+def fork_safe_runtime(backend):
+    """
+    Whether models of this backend can be loaded before fork() and used by
+    the children: onnxruntime and the standalone TFLite interpreters, but not
+    TensorFlow's own tf.lite (its runtime does not survive a fork)
+    """
+    if backend == 'onnx':
+        return ONNX_AVAILABLE
+    return _tflite_module() not in (None, 'tensorflow')
+
+
+def exported_model_path(model_path, backend):
+    """Where export_models.py writes the converted copy of a Keras weights file"""
+    name = os.path.basename(model_path).split('.')[0]
+    return os.path.join(settings.EXPORTED_MODELS_PATH, name + BACKEND_EXTENSIONS[backend])
+
+
+class TFLiteModel:
+    """A .tflite disease model; batches of any size are run by resizing the input"""
+
+    backend = 'tflite'
+
+    def __init__(self, path, num_threads=0):
+        self.path = path
+        if path.endswith(BACKEND_EXTENSIONS['tflite_int8']):
+            self.backend = 'tflite_int8'
+        self.memory_bytes = os.path.getsize(path)
+        self._interpreter = _tflite_interpreter_class()(model_path=path, num_threads=num_threads or None)
+        self._input = self._interpreter.get_input_details()[0]['index']
+        self._output = self._interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+        # An interpreter is not safe to call from several threads at once
+        self._lock = threading.Lock()
+
+    def predict(self, batch, verbose=0):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input, batch.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self._interpreter.set_tensor(self._input, batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output).copy()
+
+
+class OnnxModel:
+    """An .onnx disease model run with ONNX Runtime on the CPU"""
+
+    backend = 'onnx'
+
+    def __init__(self, path, num_threads=0):
+        if not ONNX_AVAILABLE:
+            raise ImportError("onnxruntime is not installed")
+        import onnxruntime as ort
+        self.path = path
+        self.memory_bytes = os.path.getsize(path)
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self._input = self._session.get_inputs()[0].name
+
+    def predict(self, batch, verbose=0):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._session.run(None, {self._input: batch})[0]
+
+
+RUNTIME_MODELS = {
+    'tflite': TFLiteModel,
+    'tflite_int8': TFLiteModel,
+    'onnx': OnnxModel
+}
+
+
+def load_runtime_model(model_path, backend, num_threads=0):
+    """
+    Load the exported copy of a Keras model for a runtime backend.
+    Returns (runtime_model, exported_path), or (None, None) if there is no
+    exported file yet (the caller then falls back to Keras).
+    """
+    path = exported_model_path(model_path, backend)
+    if not os.path.exists(path):
+        return None, None
+    return RUNTIME_MODELS[backend](path, num_threads), path
@@ -1,17 +1,199 @@
-import cv2
+import os
+import sys
+import threading
 import numpy as np
 
-def estimate_severity(image_path):
-    img = cv2.imread(image_path)
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.decoded_image import SEVERITY_INPUT_SIZE, load_image
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# Yellow-brown (lesion) pixels in OpenCV HSV
+LESION_HSV_LOWER = np.array([10, 40, 40])
+LESION_HSV_UPPER = np.array([35, 255, 255])
+# Healthy green tissue (same range as utils/preprocess.remove_background)
+LEAF_HSV_LOWER = np.array([25, 40, 40])
+LEAF_HSV_UPPER = np.array([90, 255, 255])
+
+# The leaf outline is the green tissue closed over gaps up to this wide (in
+# 256x256 pixels) with its holes filled, so lesions inside or notching the
+# leaf edge are part of it. Lesion-colored regions beyond that are leaf too
+# (necrotic tissue of a badly diseased leaf) unless they touch the image
+# border, as brown soil or mulch around the leaf does
+LEAF_CLOSE_SIZE = 15
+LEAF_CLEANUP_KERNEL = np.ones((5, 5), np.uint8)
+MIN_LESION_PIXELS = 4  # Smaller specks at the analysis resolution are noise
+# Below this leaf coverage (percent of the frame) no leaf was found and
+# severity is measured over the whole frame, as before leaf masking
+MIN_LEAF_COVERAGE_PERCENT = 2.0
+# Lesion size classes, as a percentage of the leaf area: small < 0.1 <= medium < 1 <= large
+LESION_SIZE_BINS = np.array([0.1, 1.0])
+LESION_SIZE_NAMES = ['small', 'medium', 'large']
+
+# Images per cvtColor/inRange call for stacked input: a 256x256 chunk of 4
+# (about 1MB of buffers) stays in cache, where one call over a whole batch
+# streams every intermediate through memory and ends up slower than per image
+SEVERITY_CHUNK = 4
+
+
+class LesionAnalyzer:
+    """
+    Lesion statistics at the fixed severity resolution (256x256).
+
+    All masks and the label image are allocated once and reused, so the cost
+    per image is fixed whatever the upload's size. Not thread-safe: use
+    analyzer() for the calling thread's instance.
+    """
+
+    def __init__(self, size=SEVERITY_INPUT_SIZE, chunk=SEVERITY_CHUNK):
+        self.size = size
+        self.chunk = chunk
+        self._hsv = np.empty((chunk * size, size, 3), dtype=np.uint8)
+        self._lesion = np.empty((chunk * size, size), dtype=np.uint8)
+        self._green = np.empty((chunk * size, size), dtype=np.uint8)
+        self._leaf = np.empty((size, size), dtype=np.uint8)
+        self._outside = np.empty((size, size), dtype=np.uint8)
+        self._labels = np.empty((size, size), dtype=np.int32)
+        self._close_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (LEAF_CLOSE_SIZE, LEAF_CLOSE_SIZE))
+
+    def analyze_hsv(self, hsv):
+        """Statistics for one size x size HSV image"""
+        size = self.size
+        cv2.inRange(hsv, LESION_HSV_LOWER, LESION_HSV_UPPER, dst=self._lesion[:size])
+        cv2.inRange(hsv, LEAF_HSV_LOWER, LEAF_HSV_UPPER, dst=self._green[:size])
+        return self._analyze_masks(self._green[:size], self._lesion[:size])
+
+    def analyze_bgr(self, bgr_batch):
+        """Statistics for an (N, size, size, 3) BGR stack, converted a chunk at a time"""
+        results = []
+        size = self.size
+        for start in range(0, len(bgr_batch), self.chunk):
+            part = np.ascontiguousarray(bgr_batch[start:start + self.chunk])
+            rows = len(part) * size
+            # One cvtColor and one inRange per mask for the whole chunk, viewed as a tall image
+            cv2.cvtColor(part.reshape(rows, size, 3), cv2.COLOR_BGR2HSV, dst=self._hsv[:rows])
+            cv2.inRange(self._hsv[:rows], LESION_HSV_LOWER, LESION_HSV_UPPER, dst=self._lesion[:rows])
+            cv2.inRange(self._hsv[:rows], LEAF_HSV_LOWER, LEAF_HSV_UPPER, dst=self._green[:rows])
+            for top in range(0, rows, size):
+                results.append(self._analyze_masks(self._green[top:top + size], self._lesion[top:top + size]))
+        return results
+
+    def _analyze_masks(self, green, lesion):
+        leaf = self._leaf
+
+        # Leaf = green tissue, cleaned up like remove_background, bridged over
+        # lesions and with enclosed holes (lesions, dark spots) filled
+        cv2.morphologyEx(green, cv2.MORPH_OPEN, LEAF_CLEANUP_KERNEL, dst=leaf)
+        cv2.morphologyEx(leaf, cv2.MORPH_CLOSE, self._close_kernel, dst=leaf)
+        contours, _ = cv2.findContours(leaf, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cv2.drawContours(leaf, contours, -1, 255, thickness=cv2.FILLED)
+
+        # Lesion-colored regions off the green leaf: interior ones are dead
+        # leaf tissue, ones reaching the image border are background
+        outside = self._outside
+        cv2.bitwise_and(lesion, cv2.bitwise_not(leaf, dst=outside), dst=outside)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(
+            outside, labels=self._labels, connectivity=8, ltype=cv2.CV_32S
+        )
+        if count > 1:
+            left, top = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+            right, bottom = left + stats[:, cv2.CC_STAT_WIDTH], top + stats[:, cv2.CC_STAT_HEIGHT]
+            interior = (left > 0) & (top > 0) & (right < self.size) & (bottom < self.size)
+            interior[0] = False  # Label 0 is everything else
+            if interior.any():
+                lookup = np.where(interior, 255, 0).astype(np.uint8)
+                cv2.bitwise_or(leaf, lookup[self._labels], dst=leaf)
+
+        leaf_pixels = cv2.countNonZero(leaf)
+        if leaf_pixels < leaf.size * MIN_LEAF_COVERAGE_PERCENT / 100:
+            # No leaf found: the whole frame counts
+            leaf.fill(255)
+
+        # Only lesions on the leaf count
+        cv2.bitwise_and(lesion, leaf, dst=lesion)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(
+            lesion, labels=self._labels, connectivity=8, ltype=cv2.CV_32S
+        )
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        areas = areas[areas >= MIN_LESION_PIXELS]
+
+        area_percent = areas / cv2.countNonZero(leaf) * 100
+        sizes = np.bincount(np.digitize(area_percent, LESION_SIZE_BINS), minlength=len(LESION_SIZE_NAMES))
+
+        return {
+            'severity_percent': round(float(area_percent.sum()), 2),
+            'leaf_coverage_percent': round(leaf_pixels / leaf.size * 100, 2),
+            'lesion_count': len(areas),
+            'lesion_area_percent': {
+                'mean': round(float(area_percent.mean()), 3) if len(areas) else 0.0,
+                'median': round(float(np.median(area_percent)), 3) if len(areas) else 0.0,
+                'max': round(float(area_percent.max()), 3) if len(areas) else 0.0
+            },
+            'lesion_sizes': dict(zip(LESION_SIZE_NAMES, sizes.tolist()))
+        }
+
+
+_local = threading.local()
+
+
+def analyzer():
+    """This thread's LesionAnalyzer (its buffers are reused by every call)"""
+    if not hasattr(_local, 'analyzer'):
+        _local.analyzer = LesionAnalyzer()
+    return _local.analyzer
+
+
+def analyze_lesions_batch(images):
+    """
+    Lesion statistics for many images.
+
+    Args:
+        images: (N, 256, 256, 3) uint8 BGR array (e.g. stacked resized_256
+                views), or a list of decoded images (whose cached 256x256 HSV
+                view, shared with the content check, is used)
+
+    Returns:
+        One dict per image: severity_percent (lesion area as a percentage of
+        the leaf), leaf_coverage_percent, lesion_count, lesion_area_percent
+        (mean / median / max per lesion) and lesion_sizes (small / medium / large)
+    """
+    if len(images) == 0:
+        return []
+    if isinstance(images, np.ndarray):
+        return analyzer().analyze_bgr(images)
+    return [analyzer().analyze_hsv(img.hsv_256) for img in images]
+
+
+def analyze_lesions(image):
+    """
+    Lesion statistics for one image (see analyze_lesions_batch).
+    Accepts an image path or an already decoded image; None if unreadable.
+    """
+    img = load_image(image)
     if img is None:
-        return 0.0
+        return None
+    return analyze_lesions_batch([img])[0]
+
+
+def estimate_severity_batch(images):
+    """
+    Diseased area (percent of the leaf) of many images at once.
+
+    Args:
+        images: (N, 256, 256, 3) uint8 BGR array or a list of decoded images
 
-    img = cv2.resize(img, (256, 256))
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    Returns:
+        (N,) float array of percentages, rounded to 2 decimals
+    """
+    return np.array([stats['severity_percent'] for stats in analyze_lesions_batch(images)])
 
-    lower = np.array([10, 40, 40])
-    upper = np.array([35, 255, 255])
-    mask = cv2.inRange(hsv, lower, upper)
 
-    severity = (np.count_nonzero(mask) / mask.size) * 100
-    return round(severity, 2)
+def estimate_severity(image):
+    """
+    Estimate the diseased area as a percentage of the leaf.
+    Accepts an image path or an already decoded image.
+    """
+    stats = analyze_lesions(image)
+    return stats['severity_percent'] if stats else 0.0
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class SharedBackbone:
+    """
+    The frozen MobileNetV2 feature extractor shared by every crop model.
+
+    train_disease_model.py only trains the pooling/dropout/dense head on top
+    of a frozen ImageNet base, so all crop .h5 files carry the same backbone.
+    It is kept once and computes the 1280-d pooled feature per image; each
+    crop then only needs its small Dense head (see CropHead).
+    """
+
+    def __init__(self, extractor, fingerprint, source_path):
+        self.extractor = extractor
+        self.fingerprint = fingerprint
+        self.source_path = source_path
+        self.memory_bytes = sum(w.nbytes for w in extractor.get_weights())
+        self.calls = 0
+
+    def features(self, batch):
+        """(N, 224, 224, 3) float32 batch -> (N, 1280) pooled features"""
+        self.calls += 1
+        return self.extractor.predict(batch, verbose=0)
+
+    def stats(self):
+        return {
+            'source_path': self.source_path,
+            'fingerprint': self.fingerprint[:12],
+            'calls': self.calls,
+            'memory_mb': round(self.memory_bytes / (1024 * 1024), 2)
+        }
+
+
+class CropHead:
+    """
+    A crop's Dense softmax head applied to shared backbone features.
+
+    Exposes the same predict()/get_weights() surface as the Keras model it
+    replaces, so a ModelEntry can hold either.
+    """
+
+    def __init__(self, backbone, kernel, bias):
+        self.backbone = backbone
+        self.kernel = kernel.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+
+    def predict(self, batch, verbose=0):
+        return self.apply(self.backbone.features(batch))
+
+    def apply(self, features):
+        return softmax(features @ self.kernel + self.bias)
+
+    def get_weights(self):
+        return [self.kernel, self.bias]
+
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def apply_heads(features, heads):
+    """
+    Score features against several crop heads with one matrix multiply.
+
+    Args:
+        features: (N, 1280) pooled backbone features
+        heads: dict of crop -> CropHead
+
+    Returns:
+        dict of crop -> (N, num_classes) softmax probabilities
+    """
+    crops = list(heads)
+    kernel = np.concatenate([heads[c].kernel for c in crops], axis=1)
+    bias = np.concatenate([heads[c].bias for c in crops])
+    logits = features @ kernel + bias
+
+    probs = {}
+    offset = 0
+    for crop in crops:
+        width = heads[crop].kernel.shape[1]
+        probs[crop] = softmax(logits[:, offset:offset + width])
+        offset += width
+    return probs
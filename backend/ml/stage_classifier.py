@@ -1,9 +1,20 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+
+# One stage per severity level in settings.SEVERITY_THRESHOLDS ("Healthy Stage", "Early Stage", ...)
+STAGE_NAMES = [f"{level.capitalize()} Stage" for level in settings.SEVERITY_THRESHOLDS]
+# Lower bound of every level but the first
+STAGE_BOUNDARIES = np.array([low for low, _ in settings.SEVERITY_THRESHOLDS.values()][1:])
+
+def classify_stages(severities):
+    """Stage names for an array of severity percentages"""
+    indices = np.digitize(np.asarray(severities, dtype=float), STAGE_BOUNDARIES)
+    return [STAGE_NAMES[i] for i in indices]
+
 def classify_stage(severity):
-    if severity < 10:
-        return "Healthy Stage"
-    elif severity < 30:
-        return "Early Stage"
-    elif severity < 60:
-        return "Moderate Stage"
-    else:
-        return "Severe Stage"
+    return classify_stages([severity])[0]
@@ -0,0 +1,77 @@
+"""
+Parity check: exported TFLite/ONNX models against the Keras originals.
+
+Runs every crop model on the same inputs (sample images if available, plus
+random tensors) through Keras and the runtime backend and reports the max
+absolute probability difference and top-1 agreement.
+
+    python test_backend_parity.py --backend tflite
+"""
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from disease_classifier import load_disease_model
+from export_models import model_specs
+from runtime_backends import load_runtime_model
+from utils.decoded_image import DecodedImage
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def parity_images(max_images=16):
+    """Real images where we have them (repo sample, uploads)"""
+    paths = glob.glob(os.path.join(BASE_DIR, "sample.*")) + glob.glob(os.path.join(settings.UPLOAD_FOLDER, "*.*"))
+    images = (DecodedImage.from_path(path) for path in paths[:max_images])
+    return [img for img in images if img is not None]
+
+
+def parity_inputs(images, input_size, seed=0):
+    """The images preprocessed at a model's input size, padded with noise"""
+    tensors = [img.classifier_input_at(input_size) for img in images]
+    rng = np.random.default_rng(seed)
+    while len(tensors) < 4:
+        tensors.append(rng.random((input_size, input_size, 3), dtype=np.float32))
+    return np.stack(tensors)
+
+
+def check_parity(backend, tolerance):
+    images = parity_images()
+    failures = 0
+    for spec in model_specs():
+        crop, model_path = spec['crop'], spec['weights']
+        runtime_model, exported_path = load_runtime_model(model_path, backend, settings.INFERENCE_THREADS)
+        if runtime_model is None:
+            print(f"  - {crop}: no {backend} export, skipped")
+            continue
+
+        batch = parity_inputs(images, spec['input_size'])
+        keras_model = load_disease_model(model_path, len(spec['class_names']), spec['input_size'])
+        keras_probs = keras_model.predict(batch, verbose=0)
+        # Single image and full batch both go through the resized interpreter
+        runtime_probs = np.concatenate([runtime_model.predict(batch[:1]), runtime_model.predict(batch[1:])])
+
+        max_diff = float(np.abs(keras_probs - runtime_probs).max())
+        agreement = float((keras_probs.argmax(axis=1) == runtime_probs.argmax(axis=1)).mean())
+        ok = max_diff <= tolerance and agreement == 1.0
+        failures += not ok
+        print(f"  {'✓' if ok else '✗'} {crop}: max |diff| {max_diff:.2e}, top-1 agreement {agreement:.0%} "
+              f"({len(batch)} inputs, {os.path.basename(exported_path)})")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare runtime backend outputs with Keras")
+    parser.add_argument("--backend", choices=["tflite", "onnx"], default=settings.INFERENCE_BACKEND)
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Max absolute probability difference")
+    args = parser.parse_args()
+
+    if args.backend == "keras":
+        raise SystemExit("Pick a runtime backend with --backend (tflite or onnx)")
+    sys.exit(1 if check_parity(args.backend, args.tolerance) else 0)
@@ -0,0 +1,77 @@
+"""
+Regression cases for the lesion-aware severity estimate, on synthetic
+256x256 leaves (drawn in BGR, so no sample photos are needed).
+
+Run directly or with pytest:
+    python test_lesion_severity.py
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.dirname(__file__))
+
+from severity_estimator import estimate_severity_batch
+from stage_classifier import classify_stage
+
+GREEN = (40, 160, 60)
+BROWN = (30, 90, 140)
+SOIL = (40, 70, 110)
+WHITE = (255, 255, 255)
+CENTER, AXES = (128, 128), (90, 60)
+
+
+def leaf_image(background, leaf_color=GREEN):
+    img = np.full((256, 256, 3), background, np.uint8)
+    cv2.ellipse(img, CENTER, AXES, 0, 0, 360, leaf_color, -1)
+    return img
+
+
+def severity(img):
+    return float(estimate_severity_batch(img[np.newaxis])[0])
+
+
+def test_healthy_leaf():
+    assert severity(leaf_image(WHITE)) < 1.0
+
+
+def test_spotted_leaf_on_soil():
+    # Soil is lesion-colored but must not count; the three spots must
+    img = leaf_image(SOIL)
+    for x in (90, 128, 166):
+        cv2.circle(img, (x, 128), 8, BROWN, -1)
+    leaf_area = np.pi * AXES[0] * AXES[1]
+    expected = 3 * np.pi * 8 ** 2 / leaf_area * 100
+    assert 0.5 * expected < severity(img) < 1.5 * expected
+
+
+def test_mostly_diseased_leaf():
+    # Brown leaf with a thin green strip along the midrib
+    img = leaf_image(WHITE, BROWN)
+    cv2.rectangle(img, (40, 124), (216, 132), GREEN, -1)
+    result = severity(img)
+    assert result > 70.0
+    assert classify_stage(result) not in ("Healthy Stage", "Early Stage")
+
+
+def test_fully_diseased_leaf():
+    result = severity(leaf_image(WHITE, BROWN))
+    assert result > 90.0
+    assert classify_stage(result) != "Healthy Stage"
+
+
+def test_diseased_leaf_filling_frame():
+    # A close-up: the brown tissue reaches the border and no green is left,
+    # so severity falls back to the share of the frame
+    img = np.full((256, 256, 3), BROWN, np.uint8)
+    assert severity(img) > 90.0
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✓ {name}")
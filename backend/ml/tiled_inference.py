@@ -0,0 +1,173 @@
+"""
+Tiled inference for high-resolution photos.
+
+The classifier normally sees one center crop resized to its input size, so
+on a 4000x3000 photo most of the leaf is cut away and an early lesion ends
+up a few pixels wide. In tiled mode (settings.TILED_INFERENCE) the image is
+scaled so its short side is TILED_INFERENCE_SIDE and cut into overlapping
+tiles at the model's input size. Tiles that are background or featureless
+are skipped by a cheap pre-filter, at most MAX_TILES_PER_IMAGE are scored
+in one model call, and the tile predictions are averaged (weighted by leaf
+area) into one label for the image, plus a coarse disease heatmap.
+"""
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config.settings import settings
+from disease_classifier import decode_prediction
+from severity_estimator import LEAF_HSV_LOWER, LEAF_HSV_UPPER
+from utils.decoded_image import normalize
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# Pre-filter: a tile is scored only if at least this share of it is green
+# leaf and its gray levels vary at least this much (sky, soil, blown-out or
+# out-of-focus background is flat)
+MIN_TILE_LEAF_FRACTION = 0.15
+MIN_TILE_GRAY_STD = 8.0
+
+
+def tile_positions(length, tile, overlap):
+    """
+    Tile offsets along one side: evenly spread, overlapping by at least
+    `overlap` of a tile, the first and last flush with the edges
+    """
+    if length <= tile:
+        return np.array([0])
+    stride = max(1, int(tile * (1 - overlap)))
+    count = math.ceil((length - tile) / stride) + 1
+    return np.linspace(0, length - tile, count).round().astype(int)
+
+
+def tiling_view(img, tile, side=None):
+    """
+    The BGR image the tiles are cut from: scaled down so its short side is
+    `side` (TILED_INFERENCE_SIDE), or up to one tile if it is smaller than that
+    """
+    side = max(side or settings.TILED_INFERENCE_SIDE, tile)
+    h, w = img.bgr.shape[:2]
+    short = min(h, w)
+    if short > side:
+        interpolation = cv2.INTER_AREA
+        scale = side / short
+    elif short < tile:
+        interpolation = cv2.INTER_LINEAR
+        scale = tile / short
+    else:
+        return img.bgr
+    return cv2.resize(img.bgr, (max(tile, round(w * scale)), max(tile, round(h * scale))),
+                      interpolation=interpolation)
+
+
+def _box_sums(integral, ys, xs, tile):
+    """Sum over every tile of the grid from an integral image"""
+    y0, x0 = np.ix_(ys, xs)
+    y1, x1 = y0 + tile, x0 + tile
+    return integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+
+def tile_stats(bgr, ys, xs, tile):
+    """
+    Pre-filter statistics of every tile in the grid, from integral images
+    (one pass over the image, then constant time per tile)
+
+    Returns:
+        (leaf_fraction, gray_std), each of shape (len(ys), len(xs))
+    """
+    leaf = cv2.inRange(cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV), LEAF_HSV_LOWER, LEAF_HSV_UPPER)
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    leaf_integral = cv2.integral(leaf, sdepth=cv2.CV_64F)
+    gray_integral, gray_sq_integral = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    area = float(tile * tile)
+    leaf_fraction = _box_sums(leaf_integral, ys, xs, tile) / (255 * area)
+    mean = _box_sums(gray_integral, ys, xs, tile) / area
+    variance = _box_sums(gray_sq_integral, ys, xs, tile) / area - mean ** 2
+    return leaf_fraction, np.sqrt(np.maximum(variance, 0))
+
+
+def select_tiles(leaf_fraction, gray_std, max_tiles):
+    """
+    Flat grid indices of the tiles to score, leafiest first and at most
+    max_tiles, and how many tiles the pre-filter dropped
+    """
+    leaf_fraction = leaf_fraction.ravel()
+    passed = np.flatnonzero((leaf_fraction >= MIN_TILE_LEAF_FRACTION) & (gray_std.ravel() >= MIN_TILE_GRAY_STD))
+    order = passed[np.argsort(-leaf_fraction[passed], kind='stable')]
+    return order[:max_tiles], leaf_fraction.size - passed.size
+
+
+def healthy_index(class_names):
+    """Index of the model's healthy class, or None"""
+    return next((i for i, name in enumerate(class_names) if 'healthy' in name.lower()), None)
+
+
+def aggregate_tiles(probs, class_names, weights):
+    """
+    One (disease_name, confidence_percent) for the image from (T, C) tile
+    probabilities: their mean weighted by each tile's leaf area (a tile that
+    is mostly leaf says more about the leaf than one at its edge),
+    renormalized, so the confidence is still a probability over the classes.
+    A lesion confined to a few tiles is diluted by this; the heatmap and
+    max_disease_probability in the tile summary keep it visible.
+    """
+    scores = np.average(probs, axis=0, weights=weights)
+    return decode_prediction(scores / scores.sum(), class_names)
+
+
+def classify_tiled(image, entry):
+    """
+    Classify a decoded image tile by tile with a registry model entry.
+
+    Args:
+        image: DecodedImage (decode it with a min_side of at least
+               TILED_INFERENCE_SIDE, see utils/upload_store.decode_min_side)
+        entry: Model registry entry (or inference service RemoteModel)
+
+    Returns:
+        ((disease_name, confidence_percent), tiles) where tiles describes the
+        grid: its rows/cols, the size of the view it was cut from, how many
+        tiles were scored, dropped by the pre-filter or over the cap, a
+        rows x cols heatmap of disease probability (None where not scored)
+        and the highest disease probability of any scored tile.
+        If no tile passes the pre-filter the center crop is scored instead,
+        as without tiling.
+    """
+    size = entry.input_size
+    bgr = tiling_view(image, size)
+    ys = tile_positions(bgr.shape[0], size, settings.TILE_OVERLAP)
+    xs = tile_positions(bgr.shape[1], size, settings.TILE_OVERLAP)
+    leaf_fraction, gray_std = tile_stats(bgr, ys, xs, size)
+    chosen, filtered = select_tiles(leaf_fraction, gray_std, settings.MAX_TILES_PER_IMAGE)
+
+    rows, cols = len(ys), len(xs)
+    tiles = {
+        'grid': [rows, cols],
+        'view_size': [bgr.shape[1], bgr.shape[0]],
+        'scored': len(chosen),
+        'filtered': int(filtered),
+        'capped': int(rows * cols - filtered - len(chosen)),
+        'heatmap': [[None] * cols for _ in range(rows)],
+        'max_disease_probability': None
+    }
+    if len(chosen) == 0:
+        print("DEBUG: No tile passed the pre-filter, scoring the center crop")
+        probs = entry.predict(image.classifier_input_at(size)[np.newaxis])
+        return decode_prediction(probs[0], entry.class_names), tiles
+
+    # BGR -> RGB by reversing channels; normalize makes the batch contiguous
+    crops = np.stack([bgr[ys[i // cols]:ys[i // cols] + size, xs[i % cols]:xs[i % cols] + size] for i in chosen])
+    probs = entry.predict(normalize(crops[..., ::-1]))
+
+    healthy = healthy_index(entry.class_names)
+    disease_probs = 1 - probs[:, healthy] if healthy is not None else probs.max(axis=1)
+    for i, p in zip(chosen, disease_probs):
+        tiles['heatmap'][i // cols][i % cols] = round(float(p), 3)
+    tiles['max_disease_probability'] = round(float(disease_probs.max()), 3)
+    return aggregate_tiles(probs, entry.class_names, leaf_fraction.ravel()[chosen]), tiles
@@ -0,0 +1,96 @@
+"""
+Import-time profile of the API process.
+
+Imports a module (default: app) in a fresh interpreter with
+`python -X importtime`, then reports wall time, peak memory, the slowest
+imports and whether any heavy ML package (TensorFlow, Keras, OpenCV) was
+loaded eagerly. Those should only load on the first inference request.
+
+Examples:
+    python profile_imports.py
+    python profile_imports.py --top 30 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+HEAVY_MODULES = ('tensorflow', 'keras', 'cv2', 'onnxruntime', 'tflite_runtime', 'ai_edge_litert')
+
+# Runs in the child: import the target, then report time, RSS and what got loaded for real
+CHILD_SCRIPT = '''
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+loaded = [
+    name for name in {heavy!r}
+    if name in sys.modules and type(sys.modules[name]).__name__ != '_LazyModule'
+]
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_loaded': loaded
+}}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def profile(module):
+    """Returns (summary dict, list of (cumulative_us, self_us, depth, name))"""
+    script = CHILD_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((int(cumulative_us), int(self_us), (len(indent) - 1) // 2, name))
+
+    summary = json.loads(proc.stdout.strip().splitlines()[-1])
+    return summary, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time of the API process")
+    parser.add_argument('--module', default='app', help="Module to import (default: app)")
+    parser.add_argument('--top', type=int, default=15, help="Number of top-level imports to list")
+    parser.add_argument('--budget-ms', type=float, help="Exit non-zero if the import takes longer")
+    args = parser.parse_args()
+
+    summary, imports = profile(args.module)
+    total_ms = summary['seconds'] * 1000
+
+    print(f"import {args.module}: {total_ms:.0f} ms, peak RSS {summary['max_rss_mb']:.0f} MB, "
+          f"{len(imports)} modules")
+
+    # Direct dependencies of the target, by cumulative time
+    target_depth = next((depth for _, _, depth, name in imports if name == args.module), 0)
+    direct = sorted((i for i in imports if i[2] == target_depth + 1), reverse=True)
+    print(f"\nSlowest imports under {args.module}:")
+    for cumulative_us, self_us, _, name in direct[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if summary['heavy_loaded']:
+        print(f"\n✗ Heavy ML packages imported eagerly: {', '.join(summary['heavy_loaded'])}")
+    else:
+        print("\n✓ No heavy ML packages imported (they load on first inference)")
+
+    over_budget = args.budget_ms is not None and total_ms > args.budget_ms
+    if over_budget:
+        print(f"✗ Over budget: {total_ms:.0f} ms > {args.budget_ms:.0f} ms")
+    sys.exit(1 if over_budget or summary['heavy_loaded'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Production server: a pre-forking master with N web worker processes.
+
+The master imports the app (settings, seed data, translation bundles) and,
+when the configured runtime allows it, loads every crop model, then forks
+the workers. Everything loaded before the fork is shared copy-on-write, so
+N workers cost about one copy of the models instead of N.
+
+Only the exported runtimes (INFERENCE_BACKEND=tflite / onnx, or
+QUANTIZED_CROPS) can be loaded before forking. TensorFlow's runtime hangs
+in a forked child, so Keras models are loaded by each worker after the
+fork instead (or run INFERENCE_SERVICE_ADDRESS to keep them out of the web
+workers entirely).
+
+Signals (to the master):
+    HUP        graceful reload: start a fresh set of workers from the master
+               (models already resident, no weights re-read), then let the
+               old ones finish their in-flight requests and exit
+    TERM, INT  graceful shutdown
+
+Examples:
+    python serve.py
+    python serve.py --workers 4 --port 8000
+    kill -HUP <master pid>
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'ml'))
+
+from config.settings import settings
+
+POLL_INTERVAL = 0.5  # seconds between master checks for signals and dead workers
+
+
+def run_worker(app, listen_socket, preload_models):
+    """Serve requests on the inherited socket until told to stop (runs in the child)"""
+    from werkzeug.serving import make_server
+
+    host, port = listen_socket.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=listen_socket.fileno())
+    # Let in-flight requests finish when shutting down instead of dropping them
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(*_):
+        # shutdown() waits for serve_forever, which runs in this (main) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    if preload_models and not settings.INFERENCE_SERVICE_ADDRESS:
+        from model_registry import model_registry
+        if not model_registry.fork_safe():
+            # Nothing was loaded before the fork; warm this worker in the background
+            threading.Thread(target=model_registry.preload, name='model-preload', daemon=True).start()
+
+    server.serve_forever()
+    server.server_close()
+
+
+class PreforkServer:
+    """Forks and supervises the web workers; replaces crashed ones and reloads on SIGHUP"""
+
+    def __init__(self, app, listen_socket, num_workers, graceful_timeout, preload_models):
+        self.app = app
+        self.socket = listen_socket
+        self.num_workers = num_workers
+        self.graceful_timeout = graceful_timeout
+        self.preload_models = preload_models
+        self.workers = set()  # pids of the current generation
+        self.retiring = {}  # pid -> deadline, old generation finishing its requests
+        self._reload = False
+        self._stop = False
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        self._spawn_workers()
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                self._reload_workers()
+            self._reap()
+            self._kill_overdue()
+            while len(self.workers) < self.num_workers and not self._stop:
+                self._spawn()
+            time.sleep(POLL_INTERVAL)
+        self._shutdown()
+
+    def _spawn_workers(self):
+        for _ in range(self.num_workers):
+            self._spawn()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.socket, self.preload_models)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                # Never fall back into the master's loop
+                os._exit(code)
+        self.workers.add(pid)
+        print(f"DEBUG: Started worker {pid}")
+
+    def _reload_workers(self):
+        old = self.workers
+        self.workers = set()
+        self._spawn_workers()
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+            self.retiring[pid] = deadline
+        print(f"Reloaded: {len(self.workers)} new workers, {len(old)} finishing their requests")
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                self.workers.discard(pid)
+                if not self._stop:
+                    print(f"DEBUG: Worker {pid} exited unexpectedly (status {status}), replacing it")
+            self.retiring.pop(pid, None)
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                print(f"DEBUG: Worker {pid} did not finish within {self.graceful_timeout}s, killing it")
+                self._signal(pid, signal.SIGKILL)
+                self.retiring[pid] = float('inf')
+
+    def _shutdown(self):
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+            self.retiring[pid] = deadline
+        self.workers = set()
+        while self.retiring:
+            self._reap()
+            self._kill_overdue()
+            time.sleep(POLL_INTERVAL / 5)
+        self.socket.close()
+
+    def _signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _on_reload(self, *_):
+        self._reload = True
+
+    def _on_stop(self, *_):
+        self._stop = True
+
+
+def load_before_fork():
+    """Load what the workers will share; returns a short description for the log"""
+    if settings.INFERENCE_SERVICE_ADDRESS:
+        return f"models served by the inference service at {settings.INFERENCE_SERVICE_ADDRESS}"
+
+    from model_registry import model_registry
+    from crop_classifier import auto_crop_available, get_crop_model
+
+    keys = model_registry.crops()
+    if auto_crop_available():
+        keys.append(settings.CROP_MODEL_PATH)
+    if not model_registry.fork_safe(keys):
+        return ("Models are loaded by each worker (to share one copy, export them with ml/export_models.py "
+                "and install onnxruntime, ai-edge-litert or tflite-runtime)")
+
+    model_registry.preload()
+    if auto_crop_available():
+        get_crop_model()
+    return f"{len(keys)} models loaded once and shared by all workers"
+
+
+def serve(app, host, port, num_workers, graceful_timeout=30, preload_models=None):
+    """
+    Run the app with pre-forked workers until SIGTERM/SIGINT.
+
+    Args:
+        app: The Flask app (imported without its background preload thread -
+             threads must not be running when the workers are forked)
+        preload_models: Load Keras models in each worker at start instead of on
+             first use (default: settings.PRELOAD_MODELS); exported models are
+             always loaded in the master
+    """
+    if preload_models is None:
+        preload_models = settings.PRELOAD_MODELS
+    if not hasattr(os, 'fork'):
+        raise SystemExit("serve.py needs fork() (Linux/macOS); on Windows run app.py")
+
+    listen_socket = socket.create_server((host, port), backlog=128)
+    listen_socket.set_inheritable(True)
+    models = load_before_fork()
+
+    print("=" * 60)
+    print("🌾 AI CROP DIAGNOSIS API SERVER")
+    print("=" * 60)
+    print(f"Server listening on http://{host}:{port} (master pid {os.getpid()}, {num_workers} workers)")
+    print(f"Models: {models}")
+    print("Reload workers: kill -HUP", os.getpid())
+    print("=" * 60)
+    sys.stdout.flush()
+
+    PreforkServer(app, listen_socket, num_workers, graceful_timeout, preload_models).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked worker processes")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument("--graceful-timeout", type=float, default=settings.SERVER_GRACEFUL_TIMEOUT,
+                        help="Seconds a stopping worker gets to finish its requests")
+    args = parser.parse_args()
+
+    # Models are loaded before the fork (or by each worker) here, so keep
+    # app.py from starting its background preload thread at import
+    preload_models = settings.PRELOAD_MODELS
+    settings.PRELOAD_MODELS = False
+    from app import app
+    serve(app, args.host, args.port, args.workers, args.graceful_timeout, preload_models)
+
+
+if __name__ == "__main__":
+    main()
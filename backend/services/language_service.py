@@ -1,10 +1,17 @@
 from deep_translator import GoogleTranslator
-from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Iterable
 import json
 import os
 
-# Cache for translations to reduce API calls
-translation_cache = {}
+from config.settings import settings
+
+# Persistent, bounded cache for translations to reduce API calls
+from services.translation_store import translation_store
+from services.translation_bundles import disease_display_name, load_bundles
+
+# Precompiled seed-content translations: known texts never hit the network
+load_bundles()
 
 # Load base translations from file
 TRANSLATIONS_FILE = os.path.join(
@@ -24,6 +31,21 @@ def load_base_translations() -> Dict:
 
 base_translations = load_base_translations()
 
+# Network translations run concurrently: deep-translator's translate_batch is
+# itself one blocking request per text, so fanning out is what saves time
+_translation_pool = ThreadPoolExecutor(
+    max_workers=settings.TRANSLATION_WORKERS, thread_name_prefix='translate'
+)
+
+def _translate_remote(text: str, target_language: str, source_language: str = 'en') -> Optional[str]:
+    """One network translation; None if it fails"""
+    try:
+        translator = GoogleTranslator(source=source_language, target=target_language)
+        return translator.translate(text) or None
+    except Exception as e:
+        print(f"Translation error: {e}")
+        return None
+
 def translate_text(text: str, target_language: str = 'en', source_language: str = 'en') -> str:
     """
     Translate text to target language using Google Translate (deep-translator)
@@ -33,24 +55,20 @@ def translate_text(text: str, target_language: str = 'en', source_language: str
         return text
     
     # Check cache first
-    cache_key = f"{text}_{source_language}_{target_language}"
-    if cache_key in translation_cache:
-        return translation_cache[cache_key]
+    cached = translation_store.get(text, target_language, source_language)
+    if cached is not None:
+        return cached
     
-    try:
-        # Translate using deep-translator
-        # It handles tokens and limits better than googletrans
-        translator = GoogleTranslator(source=source_language, target=target_language)
-        translated_text = translator.translate(text)
-        
-        # Cache the translation
-        translation_cache[cache_key] = translated_text
-        
-        return translated_text
-    except Exception as e:
-        print(f"Translation error: {e}")
+    # Translate using deep-translator
+    # It handles tokens and limits better than googletrans
+    translated_text = _translate_remote(text, target_language, source_language)
+    if translated_text is None:
         # Return original text if translation fails
         return text
+    
+    # Cache the translation
+    translation_store.put(text, translated_text, target_language, source_language)
+    return translated_text
 
 def translate_batch(texts: Dict[str, str], target_language: str) -> Dict[str, str]:
     """
@@ -60,71 +78,85 @@ def translate_batch(texts: Dict[str, str], target_language: str) -> Dict[str, st
     if target_language == 'en':
         return texts
         
-    results = {}
+    # Only send texts that have never been translated before
+    cached = translation_store.get_many(texts.values(), target_language)
+    results = {key: cached[text] for key, text in texts.items() if text in cached}
+    texts = {key: text for key, text in texts.items() if text not in cached}
+    if not texts:
+        return results
+    
+    # Each distinct text is sent once, concurrently on the bounded pool;
+    # a text that fails falls back to the original and isn't cached
+    values = list(dict.fromkeys(texts.values()))
+    print(f"DEBUG: Translating {len(values)} distinct texts with {settings.TRANSLATION_WORKERS} workers...")
+    translations = dict(zip(values, _translation_pool.map(
+        lambda text: _translate_remote(text, target_language), values
+    )))
+    
+    new_translations = {text: translated for text, translated in translations.items() if translated}
+    for key, text in texts.items():
+        results[key] = new_translations.get(text, text)
+    
+    translation_store.put_many(new_translations, target_language)
+    print(f"DEBUG: {len(new_translations)}/{len(values)} texts translated")
     
-    try:
-        keys = list(texts.keys())
-        values = list(texts.values())
-        
-        # deep-translator handles batch translation efficiently
-        translator = GoogleTranslator(source='en', target=target_language)
-        
-        # Chunking to avoid timeouts or API limits with large batches
-        BATCH_SIZE = 50 
-        translations = []
-        
-        print(f"DEBUG: Starting translation of {len(values)} items in batches of {BATCH_SIZE}...")
-        
-        for i in range(0, len(values), BATCH_SIZE):
-            chunk = values[i:i + BATCH_SIZE]
-            print(f"DEBUG: Processing chunk {i//BATCH_SIZE + 1}/{(len(values)-1)//BATCH_SIZE + 1}...")
-            try:
-                # Translate chunk
-                chunk_results = translator.translate_batch(chunk)
-                translations.extend(chunk_results)
-            except Exception as chunk_error:
-                print(f"DEBUG: Chunk failed: {chunk_error}")
-                # Fallback: append original values for this failed chunk
-                translations.extend(chunk)
-        
-        print(f"DEBUG: translate_batch return type: {type(translations)}")
-        if translations:
-            print(f"DEBUG: First translated item: '{translations[0]}'")
-            print(f"DEBUG: Total items translated: {len(translations)}")
-        else:
-            print("DEBUG: translate_batch returned empty/None")
-
-        for i, key in enumerate(keys):
-            # Fallback if something went wrong in matching indices
-            if i < len(translations):
-                translated_text = translations[i]
-                results[key] = translated_text
-                
-                # Check if it's the same as original (failed translation?)
-                if translated_text == values[i] and target_language != 'en':
-                     pass # print(f"DEBUG: Item {i} returned same as source")
-                
-                # Cache it
-                cache_key = f"{values[i]}_en_{target_language}"
-                translation_cache[cache_key] = translated_text
-            else:
-                results[key] = values[i]
-            
-    except Exception as e:
-        print(f"Batch translation error: {e}") # Ensure this is printed
-        # Fallback to individual translation if batch fails
-        for key, text in texts.items():
-            results[key] = translate_text(text, target_language)
-            
     return results
 
-def translate_diagnosis_result(result: Dict, target_language: str) -> Dict:
+class TranslationJob:
+    """
+    Request-scoped translation: fields are registered while the response is
+    built, then translated together by run().
+
+    Registered fields keep their English text until run(), which looks up
+    every distinct text once and translates the uncached ones concurrently
+    (see translate_batch). A text that fails to translate stays in English.
+    """
+    
+    def __init__(self, target_language: str):
+        self.target_language = target_language
+        self._fields = []  # (container, key, english text)
+    
+    def add(self, container: Dict, key: str, text: Optional[str] = None):
+        """Translate container[key] (or the given text into it) when the job runs"""
+        text = container.get(key) if text is None else text
+        if not text or self.target_language == 'en':
+            return
+        container[key] = text
+        self._fields.append((container, key, text))
+    
+    def add_fields(self, container: Dict, keys: Iterable[str]):
+        for key in keys:
+            if key in container:
+                self.add(container, key)
+    
+    def run(self):
+        if not self._fields:
+            return
+        texts = {text: text for _, _, text in self._fields}
+        try:
+            translated = translate_batch(texts, self.target_language)
+        except Exception as e:
+            print(f"Translation job error: {e}")
+            translated = texts
+        for container, key, text in self._fields:
+            container[key] = translated.get(text) or text
+        self._fields = []
+
+def _translate_field(translated: Dict, key: str, text: str, target_language: str, job: Optional[TranslationJob]):
+    """Translate text into translated[key] now, or register it with the job"""
+    if job is not None:
+        job.add(translated, key, text)
+    else:
+        translated[key] = translate_text(text, target_language)
+
+def translate_diagnosis_result(result: Dict, target_language: str, job: Optional[TranslationJob] = None) -> Dict:
     """
     Translate diagnosis result to target language
     
     Args:
         result: Diagnosis result dictionary
         target_language: Target language code
+        job: Request translation job to defer to (fields are filled in by job.run())
         
     Returns:
         Translated result dictionary
@@ -136,14 +168,11 @@ def translate_diagnosis_result(result: Dict, target_language: str) -> Dict:
     
     # Translate disease name (keep original format for reference)
     if 'disease' in result:
-        translated['disease_local'] = translate_text(
-            result['disease'].replace('___', ' - ').replace('_', ' '),
-            target_language
-        )
+        _translate_field(translated, 'disease_local', disease_display_name(result['disease']), target_language, job)
     
     # Translate stage
     if 'stage' in result:
-        translated['stage_local'] = translate_text(result['stage'], target_language)
+        _translate_field(translated, 'stage_local', result['stage'], target_language, job)
     
     # Translate crop name
     if 'crop' in result:
@@ -157,17 +186,18 @@ def translate_diagnosis_result(result: Dict, target_language: str) -> Dict:
         if crop in crop_names and target_language in crop_names[crop]:
             translated['crop_local'] = crop_names[crop][target_language]
         else:
-            translated['crop_local'] = translate_text(crop, target_language)
+            _translate_field(translated, 'crop_local', crop, target_language, job)
     
     return translated
 
-def translate_disease_info(disease_info: Dict, target_language: str) -> Dict:
+def translate_disease_info(disease_info: Dict, target_language: str, job: Optional[TranslationJob] = None) -> Dict:
     """
     Translate disease information (description, symptoms, prevention)
     
     Args:
         disease_info: Disease information dictionary
         target_language: Target language code
+        job: Request translation job to defer to (fields are filled in by job.run())
         
     Returns:
         Translated disease information
@@ -177,27 +207,21 @@ def translate_disease_info(disease_info: Dict, target_language: str) -> Dict:
     
     translated = disease_info.copy()
     
-    # Translate description
-    if 'description' in disease_info:
-        translated['description'] = translate_text(disease_info['description'], target_language)
-    
-    # Translate symptoms
-    if 'symptoms' in disease_info:
-        translated['symptoms'] = translate_text(disease_info['symptoms'], target_language)
-    
-    # Translate prevention steps
-    if 'prevention_steps' in disease_info:
-        translated['prevention_steps'] = translate_text(disease_info['prevention_steps'], target_language)
+    # Translate description, symptoms and prevention steps
+    for key in ('description', 'symptoms', 'prevention_steps'):
+        if key in disease_info:
+            _translate_field(translated, key, disease_info[key], target_language, job)
     
     return translated
 
-def translate_pesticide_info(pesticide_info: Dict, target_language: str) -> Dict:
+def translate_pesticide_info(pesticide_info: Dict, target_language: str, job: Optional[TranslationJob] = None) -> Dict:
     """
     Translate pesticide information
     
     Args:
         pesticide_info: Pesticide information dictionary
         target_language: Target language code
+        job: Request translation job to defer to (fields are filled in by job.run())
         
     Returns:
         Translated pesticide information
@@ -207,17 +231,10 @@ def translate_pesticide_info(pesticide_info: Dict, target_language: str) -> Dict
     
     translated = pesticide_info.copy()
     
-    # Translate dosage
-    if 'dosage_per_acre' in pesticide_info:
-        translated['dosage_per_acre'] = translate_text(pesticide_info['dosage_per_acre'], target_language)
-    
-    # Translate frequency
-    if 'frequency' in pesticide_info:
-        translated['frequency'] = translate_text(pesticide_info['frequency'], target_language)
-    
-    # Translate warnings
-    if 'warnings' in pesticide_info:
-        translated['warnings'] = translate_text(pesticide_info['warnings'], target_language)
+    # Translate dosage, frequency and warnings
+    for key in ('dosage_per_acre', 'frequency', 'warnings'):
+        if key in pesticide_info:
+            _translate_field(translated, key, pesticide_info[key], target_language, job)
     
     # Translate type
     if 'type' in pesticide_info:
@@ -253,6 +270,15 @@ def get_ui_text(key: str, language: str = 'en') -> str:
     # Return key if not found
     return key
 
+def get_translated_ui_labels(language: str = 'en') -> Dict[str, str]:
+    """
+    All UI labels in the given language from translations.json, with English
+    for any key that has no manual translation (no network calls)
+    """
+    labels = dict(base_translations.get('en', {}))
+    labels.update(base_translations.get(language, {}))
+    return labels
+
 def get_supported_languages() -> Dict[str, str]:
     """Get list of supported languages"""
     return {
@@ -5,6 +5,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from database.db_connection import db
 from typing import List, Dict
 
+# Treatment approach text by urgency (also used to build translation bundles)
+TREATMENT_APPROACHES = {
+    'none': 'No specific pesticides found. Consult agricultural expert.',
+    'low': 'Preventive measures recommended. Monitor regularly.',
+    'medium': 'Early stage detected. Start with organic treatment.',
+    'high': 'Moderate infection. Use effective fungicides/insecticides.',
+    'critical': 'Severe infection. Immediate aggressive treatment required.'
+}
+
 def get_pesticides_for_disease(disease_name: str, crop: str, prefer_organic: bool = False) -> List[Dict]:
     """
     Get recommended pesticides for a specific disease
@@ -126,7 +135,7 @@ def get_severity_based_recommendations(disease_name: str, severity_percent: floa
         return {
             'severity_level': get_severity_level(severity_percent),
             'recommended_pesticides': [],
-            'treatment_approach': 'No specific pesticides found. Consult agricultural expert.',
+            'treatment_approach': TREATMENT_APPROACHES['none'],
             'urgency': 'medium'
         }
     
@@ -135,25 +144,25 @@ def get_severity_based_recommendations(disease_name: str, severity_percent: floa
     # Determine treatment approach based on severity
     if severity_percent < 5:
         # Healthy or very early stage
-        approach = 'Preventive measures recommended. Monitor regularly.'
+        approach = TREATMENT_APPROACHES['low']
         urgency = 'low'
         recommended = [p for p in all_pesticides if p['is_organic']][:2]
     elif severity_percent < 25:
         # Early stage - prefer organic
-        approach = 'Early stage detected. Start with organic treatment.'
+        approach = TREATMENT_APPROACHES['medium']
         urgency = 'medium'
         recommended = [p for p in all_pesticides if p['is_organic']][:3]
         if len(recommended) < 2:
             recommended.extend([p for p in all_pesticides if not p['is_organic']][:2])
     elif severity_percent < 50:
         # Moderate stage - combination approach
-        approach = 'Moderate infection. Use effective fungicides/insecticides.'
+        approach = TREATMENT_APPROACHES['high']
         urgency = 'high'
         # Mix of organic and chemical
         recommended = all_pesticides[:4]
     else:
         # Severe stage - aggressive treatment
-        approach = 'Severe infection. Immediate aggressive treatment required.'
+        approach = TREATMENT_APPROACHES['critical']
         urgency = 'critical'
         # Prioritize most effective (usually chemical)
         recommended = [p for p in all_pesticides if not p['is_organic']][:3]
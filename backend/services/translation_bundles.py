@@ -0,0 +1,114 @@
+"""
+Precompiled translation bundles for the fixed seed content.
+
+Everything the detect path translates (disease and pesticide seed texts,
+disease display names, stages, treatment text) comes from a small fixed
+set. build_bundles() translates all of it once per supported language and
+writes one compact <lang>.json ({english: translated}) per language;
+load_bundles() pins them in the translation store at startup, so known
+content never triggers a network translation call.
+
+Build (needs network access, re-run after editing the seed data):
+    python -m services.translation_bundles
+    python -m services.translation_bundles --languages hi te
+"""
+import sys
+import os
+import json
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from config.settings import settings
+from services.translation_store import SEED_DIR, seed_texts, translation_store
+
+BUNDLE_DIR = os.path.join(SEED_DIR, 'translation_bundles')
+
+# Severity values that select each application note
+_APPLICATION_NOTE_SEVERITIES = (0, 10, 30, 60)
+
+
+def disease_display_name(class_name: str) -> str:
+    """'Tomato___Early_blight' -> 'Tomato - Early blight'"""
+    return class_name.replace('___', ' - ').replace('_', ' ')
+
+
+def bundle_source_texts() -> List[str]:
+    """All English texts the diagnosis response can translate"""
+    from ml.stage_classifier import STAGE_NAMES
+    from services.pesticide_service import TREATMENT_APPROACHES, get_application_note
+
+    texts = list(seed_texts())
+    for class_names in settings.CLASS_NAMES.values():
+        texts.extend(disease_display_name(name) for name in class_names)
+    texts.extend(settings.MODEL_MAP.keys())
+    texts.extend(STAGE_NAMES)
+    texts.extend(TREATMENT_APPROACHES.values())
+    texts.extend(get_application_note(s) for s in _APPLICATION_NOTE_SEVERITIES)
+    return list(dict.fromkeys(t for t in texts if t))
+
+
+def bundle_path(language: str) -> str:
+    return os.path.join(BUNDLE_DIR, f'{language}.json')
+
+
+def build_bundles(languages: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Translate every bundle text into each language and write the bundle files.
+
+    Texts already in the translation store are reused; only the rest are
+    sent to the translator. Texts that fail to translate are left out of the
+    bundle (they fall back to runtime translation).
+
+    Returns the number of entries written per language.
+    """
+    from services.language_service import translate_batch
+
+    languages = languages or [code for code in settings.SUPPORTED_LANGUAGES if code != 'en']
+    texts = bundle_source_texts()
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    written = {}
+
+    for language in languages:
+        # translate_batch only calls out for texts the store doesn't have yet
+        translated = translate_batch({text: text for text in texts}, language)
+        bundle = {text: translated[text] for text in texts if translated.get(text) and translated[text] != text}
+        with open(bundle_path(language), 'w', encoding='utf-8') as f:
+            json.dump(bundle, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        written[language] = len(bundle)
+
+    return written
+
+
+def load_bundles() -> Dict[str, int]:
+    """Load every bundle file into the translation store; missing bundles are skipped"""
+    loaded = {}
+    if not os.path.isdir(BUNDLE_DIR):
+        return loaded
+
+    for name in sorted(os.listdir(BUNDLE_DIR)):
+        if not name.endswith('.json'):
+            continue
+        language = name[:-len('.json')]
+        try:
+            with open(os.path.join(BUNDLE_DIR, name), 'r', encoding='utf-8') as f:
+                bundle = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading translation bundle {name}: {e}")
+            continue
+        translation_store.load_static(bundle, language)
+        loaded[language] = len(bundle)
+
+    return loaded
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build precompiled translation bundles for the seed content")
+    parser.add_argument('--languages', nargs='*', help="Language codes (default: all supported)")
+    args = parser.parse_args()
+
+    counts = build_bundles(args.languages)
+    for language, count in counts.items():
+        print(f"  ✓ {language}: {count} entries -> {bundle_path(language)}")
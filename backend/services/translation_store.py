@@ -0,0 +1,204 @@
+import sys
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from database.db_connection import db
+from config.settings import settings
+
+SEED_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'database', 'seed'
+)
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+class TranslationStore:
+    """
+    Translation cache with a bounded in-memory LRU in front of a table in
+    the application database.
+
+    Writes go straight through to the table, so translations survive
+    restarts and are shared by every worker process using the same database.
+    """
+
+    def __init__(self, max_memory_entries: int):
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._static = {}  # (source_language, target_language) -> {text: translation}, never evicted
+        self._lock = threading.Lock()
+        self.static_hits = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, text: str, target_language: str, source_language: str = 'en') -> Optional[str]:
+        """Get a stored translation, or None if it has never been translated"""
+        return self.get_many([text], target_language, source_language).get(text)
+
+    def get_many(self, texts: Iterable[str], target_language: str, source_language: str = 'en') -> Dict[str, str]:
+        """Look up many texts at once; only the ones found are returned"""
+        found = {}
+        missing = []
+        static = self._static.get((source_language, target_language), {})
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                key = (text, source_language, target_language)
+                if text in static:
+                    found[text] = static[text]
+                    self.static_hits += 1
+                elif key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing.append(text)
+
+        if missing:
+            from_db = self._db_get_many(missing, source_language, target_language)
+            for text, translated in from_db.items():
+                self._remember((text, source_language, target_language), translated)
+            found.update(from_db)
+            with self._lock:
+                self.db_hits += len(from_db)
+                self.misses += len(missing) - len(from_db)
+
+        return found
+
+    def put(self, text: str, translated: str, target_language: str, source_language: str = 'en'):
+        self.put_many({text: translated}, target_language, source_language)
+
+    def put_many(self, translations: Dict[str, str], target_language: str, source_language: str = 'en'):
+        """Store translations in memory and write them through to the database"""
+        if not translations:
+            return
+        for text, translated in translations.items():
+            self._remember((text, source_language, target_language), translated)
+        try:
+            with db.get_connection() as conn:
+                conn.executemany(
+                    '''INSERT OR REPLACE INTO translations
+                       (source_text, source_language, target_language, translated_text)
+                       VALUES (?, ?, ?, ?)''',
+                    [(t, source_language, target_language, tr) for t, tr in translations.items()]
+                )
+        except Exception as e:
+            print(f"Translation store write error: {e}")
+
+    def load_static(self, translations: Dict[str, str], target_language: str, source_language: str = 'en'):
+        """Add precompiled translations (bundles) that stay resident and bypass the database"""
+        with self._lock:
+            self._static.setdefault((source_language, target_language), {}).update(translations)
+
+    def stats(self) -> Dict:
+        try:
+            stored = db.execute_query('SELECT COUNT(*) AS n FROM translations')[0]['n']
+        except Exception:
+            stored = None
+        return {
+            'static_entries': sum(len(t) for t in self._static.values()),
+            'memory_entries': len(self._memory),
+            'max_memory_entries': self.max_memory_entries,
+            'stored_entries': stored,
+            'static_hits': self.static_hits,
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses
+        }
+
+    def _remember(self, key, translated: str):
+        with self._lock:
+            self._memory[key] = translated
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _db_get_many(self, texts: List[str], source_language: str, target_language: str) -> Dict[str, str]:
+        found = {}
+        try:
+            for i in range(0, len(texts), _QUERY_CHUNK):
+                chunk = texts[i:i + _QUERY_CHUNK]
+                rows = db.execute_query(
+                    f'''SELECT source_text, translated_text FROM translations
+                        WHERE source_language = ? AND target_language = ?
+                        AND source_text IN ({','.join('?' * len(chunk))})''',
+                    (source_language, target_language, *chunk)
+                )
+                found.update({row['source_text']: row['translated_text'] for row in rows})
+        except Exception as e:
+            print(f"Translation store read error: {e}")
+        return found
+
+
+def seed_texts() -> List[str]:
+    """English texts from the disease and pesticide seed data that get translated at runtime"""
+    texts = []
+    with open(os.path.join(SEED_DIR, 'diseases.json'), 'r', encoding='utf-8') as f:
+        for disease in json.load(f):
+            texts.extend(disease.get(k) for k in ('description', 'symptoms', 'prevention_steps'))
+    with open(os.path.join(SEED_DIR, 'pesticides.json'), 'r', encoding='utf-8') as f:
+        for pesticide in json.load(f):
+            texts.extend(pesticide.get(k) for k in ('dosage_per_acre', 'frequency', 'warnings'))
+    return list(dict.fromkeys(t for t in texts if t))
+
+
+def prewarm(languages: Optional[List[str]] = None, translate_missing: bool = True) -> Dict[str, int]:
+    """
+    Fill the store from the seed data.
+
+    The hand-written UI translations in translations.json are stored as-is.
+    Disease and pesticide texts that aren't stored yet are translated in
+    batches (network calls) unless translate_missing is False.
+
+    Returns the number of newly stored translations per language.
+    """
+    from services.language_service import base_translations, translate_batch
+
+    languages = languages or [code for code in settings.SUPPORTED_LANGUAGES if code != 'en']
+    english_ui = base_translations.get('en', {})
+    texts = seed_texts()
+    added = {}
+
+    for language in languages:
+        # Manual UI translations keyed by the English text
+        manual = {
+            english_ui[key]: value
+            for key, value in base_translations.get(language, {}).items()
+            if key in english_ui
+        }
+        translation_store.put_many(manual, language)
+        added[language] = len(manual)
+
+        if translate_missing:
+            known = translation_store.get_many(texts, language)
+            missing = {text: text for text in texts if text not in known}
+            if missing:
+                print(f"Translating {len(missing)} seed texts to '{language}'...")
+                # translate_batch writes its results through to the store
+                translate_batch(missing, language)
+                added[language] += len(missing)
+
+    return added
+
+
+# Global store instance
+translation_store = TranslationStore(settings.TRANSLATION_CACHE_SIZE)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-warm the translation store from seed data")
+    parser.add_argument('--languages', nargs='*', help="Language codes (default: all supported)")
+    parser.add_argument('--offline', action='store_true', help="Only store translations.json, no network calls")
+    args = parser.parse_args()
+
+    counts = prewarm(args.languages, translate_missing=not args.offline)
+    for language, count in counts.items():
+        print(f"  ✓ {language}: {count} translations stored")
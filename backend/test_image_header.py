@@ -0,0 +1,134 @@
+"""
+Unit cases for the upload header check (utils/image_header.py), on
+synthetic JPEG/PNG bytes: truncated files, frame headers behind APPn
+segments, and the dimension / decompression limits at their boundaries.
+
+Run directly or with pytest:
+    python test_image_header.py
+"""
+import os
+import struct
+import sys
+import zlib
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from config.settings import settings
+from utils.image_header import MIN_RATIO_CHECK_PIXELS, check_image_header, read_image_header
+
+
+def photo(width=400, height=300):
+    return (np.random.default_rng(0).random((height, width, 3)) * 255).astype(np.uint8)
+
+
+def encode(ext, img):
+    return cv2.imencode(ext, img)[1].tobytes()
+
+
+def jpeg_header(width, height, channels=3, segments=b''):
+    """SOI, the given segments, then a baseline SOF0 frame header (no image data)"""
+    sof = struct.pack('>BBHBHHB', 0xFF, 0xC0, 8 + 3 * channels, 8, height, width, channels)
+    return b'\xff\xd8' + segments + sof + b'\x00\x11\x00' * channels
+
+
+def app_segment(marker, payload):
+    return struct.pack('>BBH', 0xFF, marker, len(payload) + 2) + payload
+
+
+def png_header(width, height, color_type=2):
+    ihdr = b'IHDR' + struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + ihdr + struct.pack('>I', zlib.crc32(ihdr))
+
+
+def test_reads_encoded_images():
+    assert read_image_header(encode('.jpg', photo())) == ('jpeg', 400, 300, 3)
+    assert read_image_header(encode('.png', photo())) == ('png', 400, 300, 3)
+    assert check_image_header(encode('.jpg', photo()))['is_valid']
+
+
+def test_truncated_jpeg():
+    data = encode('.jpg', photo())
+    # Cut inside the first segment's length field: nothing to read
+    result = check_image_header(data[:5])
+    assert not result['is_valid'] and result['rejection'] == 'format'
+    # Cut before the frame header
+    sof = data.index(b'\xff\xc0')
+    assert read_image_header(data[:sof + 4]) is None
+    # Cut after it: the header alone is enough (uploads are checked from their first bytes)
+    assert read_image_header(data[:sof + 10]) == ('jpeg', 400, 300, 3)
+
+
+def test_truncated_png():
+    data = encode('.png', photo())
+    assert read_image_header(data[:8]) is None
+    assert read_image_header(data[:25]) is None
+    assert read_image_header(data[:26]) == ('png', 400, 300, 3)
+    assert check_image_header(data[:20])['rejection'] == 'format'
+
+
+def test_jpeg_frame_after_app_segments():
+    # JFIF, a full-size EXIF block and an ICC profile come before the frame header
+    segments = (app_segment(0xE0, b'JFIF\x00' + b'\x00' * 9)
+                + app_segment(0xE1, b'Exif\x00\x00' + b'\x00' * 65000)
+                + app_segment(0xE2, b'ICC_PROFILE\x00' + b'\x00' * 3000))
+    assert read_image_header(jpeg_header(4000, 3000, segments=segments)) == ('jpeg', 4000, 3000, 3)
+    # Fill bytes between segments are skipped too
+    assert read_image_header(jpeg_header(640, 480, segments=b'\xff\xff' + segments)) == ('jpeg', 640, 480, 3)
+
+
+def test_jpeg_without_frame_header():
+    # Scan data (SOS) before any SOF: not a readable JPEG
+    assert read_image_header(b'\xff\xd8' + app_segment(0xDA, b'\x00' * 10)) is None
+
+
+def test_dimension_limits():
+    min_width, min_height = settings.MIN_IMAGE_SIZE
+    max_width, max_height = settings.MAX_IMAGE_SIZE
+    big_file = max_width * max_height  # Large enough to keep the ratio check out of the way
+    assert check_image_header(png_header(min_width, min_height))['is_valid']
+    assert check_image_header(png_header(min_width - 1, min_height))['rejection'] == 'dimensions'
+    assert check_image_header(png_header(max_width, max_height), big_file)['is_valid']
+    assert check_image_header(png_header(max_width + 1, max_height), big_file)['rejection'] == 'dimensions'
+
+
+def test_pixel_limit_boundary():
+    # At MIN_RATIO_CHECK_PIXELS the decompression ratio is not checked; one row more and it is
+    side = int(MIN_RATIO_CHECK_PIXELS ** 0.5)
+    assert side * side == MIN_RATIO_CHECK_PIXELS
+    tiny_file = 1000
+    assert check_image_header(png_header(side, side), tiny_file)['is_valid']
+    result = check_image_header(png_header(side, side + 1), tiny_file)
+    assert not result['is_valid'] and result['rejection'] == 'decompression_bomb'
+    assert 'too large to decode' in result['reason']
+
+
+def test_decompression_ratio_boundary():
+    width, height = 2000, 1000
+    decoded_bytes = width * height * 3
+    limit = settings.MAX_DECOMPRESSION_RATIO
+    at_limit = int(np.ceil(decoded_bytes / limit))
+    assert check_image_header(jpeg_header(width, height), at_limit)['is_valid']
+    result = check_image_header(jpeg_header(width, height), at_limit - 1)
+    assert result['rejection'] == 'decompression_bomb'
+
+
+def test_real_decompression_bomb():
+    # A blank 4000x4000 PNG: a few KB that would decode to 48 MB
+    bomb = encode('.png', np.zeros((4000, 4000, 3), np.uint8))
+    result = check_image_header(bomb)
+    assert not result['is_valid'] and result['rejection'] == 'decompression_bomb'
+    assert result['dimensions'] == (4000, 4000)
+
+
+def test_unsupported_channels():
+    assert check_image_header(jpeg_header(640, 480, channels=5))['rejection'] == 'channels'
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✓ {name}")
@@ -0,0 +1,83 @@
+"""
+Regression cases for the blur check on full-size photos: sharp images of
+2048 px and more must pass, blurred or upscaled ones must not. Sharp
+inputs are mosaics of the sample uploads tiled at their own resolution
+and a synthetic 1/f (natural-image-like) texture, encoded and decoded as
+uploads are.
+
+Run directly or with pytest:
+    python test_image_quality.py
+"""
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from utils.decoded_image import DecodedImage
+from utils.image_quality_check import check_image_quality
+from utils.upload_store import decode_min_side
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "*_sample.JPG")))
+
+
+def upload(bgr):
+    data = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    return DecodedImage.from_bytes(data, min_side=decode_min_side())
+
+
+def sample_mosaic(side, seed=0):
+    tiles = [cv2.resize(cv2.imread(path), (256, 256)) for path in SAMPLES]
+    picks = np.random.default_rng(seed).integers(0, len(tiles), (side // 256) ** 2)
+    n = side // 256
+    return np.vstack([np.hstack([tiles[picks[r * n + c]] for c in range(n)]) for r in range(n)])
+
+
+def one_over_f(side, seed=0):
+    rng = np.random.default_rng(seed)
+    frequency = np.hypot(*np.meshgrid(np.fft.fftfreq(side), np.fft.fftfreq(side)))
+    frequency[0, 0] = 1
+    spectrum = (rng.normal(size=(side, side)) + 1j * rng.normal(size=(side, side))) / frequency
+    img = np.real(np.fft.ifft2(spectrum))
+    gray = ((img - img.min()) / (img.max() - img.min()) * 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def test_sharp_mosaics_pass():
+    for side in (2048, 3072):
+        result = check_image_quality(upload(sample_mosaic(side)))
+        assert result['is_valid'], (side, result)
+        assert result['blur_score'] == 1.0
+
+
+def test_sharp_one_over_f_image_passes():
+    result = check_image_quality(upload(one_over_f(3000)))
+    assert result['is_valid'], result
+
+
+def test_blurred_photo_rejected():
+    blurred = cv2.GaussianBlur(sample_mosaic(3072), (0, 0), 4)
+    result = check_image_quality(upload(blurred))
+    assert not result['is_valid'] and 'blurry' in result['reason']
+
+
+def test_upscaled_photo_rejected():
+    upscaled = cv2.resize(cv2.imread(SAMPLES[0]), (4000, 3000), interpolation=cv2.INTER_CUBIC)
+    result = check_image_quality(upload(upscaled))
+    assert not result['is_valid'] and 'blurry' in result['reason']
+
+
+def test_small_upload_unchanged():
+    # Uploads below the proxy size are scored on the image itself
+    result = check_image_quality(DecodedImage.from_path(SAMPLES[0]))
+    assert result['is_valid'] and result['dimensions'] == (256, 256)
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✓ {name}")
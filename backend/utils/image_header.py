@@ -0,0 +1,146 @@
+import struct
+from collections import namedtuple
+from typing import Dict, Optional
+
+from config.settings import settings
+
+# What the header says about an upload, read without decoding any pixel data
+ImageHeader = namedtuple('ImageHeader', ['format', 'width', 'height', 'channels'])
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SIGNATURE = b'\xff\xd8'
+
+# PNG color type -> channels
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# JPEG start-of-frame markers (SOF0-SOF15) carry the dimensions; C4 (DHT),
+# C8 (JPG) and CC (DAC) share the range but are not frames
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+
+# Decodes are always to 8-bit BGR (see DecodedImage)
+DECODED_BYTES_PER_PIXEL = 3
+# Below this many pixels a decode is cheap whatever the compression ratio
+MIN_RATIO_CHECK_PIXELS = 1_000_000
+
+
+def _read_png_header(data) -> Optional[ImageHeader]:
+    # Signature, then the IHDR chunk: length, type, width, height, bit depth, color type
+    if len(data) < 26 or bytes(data[12:16]) != b'IHDR':
+        return None
+    width, height = struct.unpack_from('>II', data, 16)
+    channels = PNG_CHANNELS.get(data[25])
+    if channels is None:
+        return None
+    return ImageHeader('png', width, height, channels)
+
+
+def _read_jpeg_header(data) -> Optional[ImageHeader]:
+    # Walk the marker segments up to the first frame header, skipping over
+    # EXIF/ICC/thumbnail segments by their length; no entropy-coded data is read
+    i = 2
+    size = len(data)
+    while i + 4 <= size:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1  # Fill byte
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            i += 2
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            return None  # Image data before any frame header
+        length = struct.unpack_from('>H', data, i + 2)[0]
+        if marker in JPEG_SOF_MARKERS:
+            if length < 8 or i + 10 > size:
+                return None
+            height, width = struct.unpack_from('>HH', data, i + 5)
+            return ImageHeader('jpeg', width, height, data[i + 9])
+        if length < 2:
+            return None
+        i += 2 + length
+    return None
+
+
+def read_image_header(data) -> Optional[ImageHeader]:
+    """
+    Read format, dimensions and channel count from JPEG/PNG bytes.
+
+    Args:
+        data: Encoded image bytes (or a memoryview of them); only the header
+              segments are looked at
+
+    Returns:
+        ImageHeader, or None if the data is not a readable JPEG or PNG
+    """
+    data = memoryview(data).cast('B')
+    if bytes(data[:8]) == PNG_SIGNATURE:
+        return _read_png_header(data)
+    if bytes(data[:2]) == JPEG_SIGNATURE:
+        return _read_jpeg_header(data)
+    return None
+
+
+def check_image_header(data, encoded_size: Optional[int] = None) -> Dict[str, any]:
+    """
+    Reject an upload from its header alone, before paying for a full decode:
+    unsupported formats, dimensions outside MIN/MAX_IMAGE_SIZE, and
+    decompression bombs (a small file that would decode to a huge bitmap)
+
+    Args:
+        data: Encoded image bytes, or at least the leading part holding the header
+        encoded_size: Size of the whole upload, if data is only its beginning
+
+    Returns:
+        Dictionary with pass/fail status (and the header fields when readable),
+        shaped like check_image_quality's result. A rejection also names the
+        failed check: 'format', 'channels', 'dimensions' or 'decompression_bomb'
+    """
+    header = read_image_header(data)
+    if header is None:
+        return {
+            'is_valid': False,
+            'reason': 'Unsupported or corrupt image. Please upload a JPEG or PNG photo.',
+            'rejection': 'format',
+            'quality_score': 0.0
+        }
+
+    result = {
+        'is_valid': True,
+        'format': header.format,
+        'dimensions': (header.width, header.height),
+        'channels': header.channels
+    }
+
+    min_width, min_height = settings.MIN_IMAGE_SIZE
+    max_width, max_height = settings.MAX_IMAGE_SIZE
+    pixels = header.width * header.height
+    encoded_size = encoded_size or len(data)
+    ratio = pixels * DECODED_BYTES_PER_PIXEL / max(encoded_size, 1)
+
+    if header.channels not in (1, 2, 3, 4):
+        result['rejection'] = 'channels'
+        result['reason'] = f'Unsupported image ({header.channels} color channels)'
+    elif header.width < min_width or header.height < min_height:
+        result['rejection'] = 'dimensions'
+        result['reason'] = f'Image too small (minimum {min_width}x{min_height} pixels)'
+    elif header.width > max_width or header.height > max_height:
+        result['rejection'] = 'dimensions'
+        result['reason'] = f'Image too large (maximum {max_width}x{max_height} pixels)'
+    elif pixels > MIN_RATIO_CHECK_PIXELS and ratio > settings.MAX_DECOMPRESSION_RATIO:
+        # Camera photos of leaves compress about 5-30x; hundreds means a crafted
+        # or blank image that would cost a full-size decode for nothing
+        print(f"DEBUG: Rejected possible decompression bomb: {header}, {encoded_size} bytes ({ratio:.0f}x)")
+        result['rejection'] = 'decompression_bomb'
+        result['reason'] = (f'Image too large to decode: {header.width}x{header.height} pixels '
+                            f'from a {encoded_size / 1024:.0f} KB file is not a camera photo.')
+
+    if 'reason' in result:
+        result['is_valid'] = False
+        result['quality_score'] = 0.0
+    return result
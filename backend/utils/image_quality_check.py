@@ -1,112 +1,240 @@
-import cv2
 import numpy as np
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional, Sequence, Union
 
-def check_image_quality(image_path: str) -> Dict[str, any]:
+from config.settings import settings
+from utils.decoded_image import DecodedImage, load_image
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# Leaf pixels: green tissue plus the yellow-brown range used for lesions
+LEAF_HSV_RANGES = [
+    (np.array([25, 40, 40]), np.array([90, 255, 255])),
+    (np.array([10, 40, 40]), np.array([35, 255, 255]))
+]
+MIN_LEAF_PIXEL_RATIO = 0.1
+
+# Quality is scored on a grayscale proxy (DecodedImage.quality_proxy) whose short
+# side is at most QUALITY_PROXY_SIZE, so its cost stays bounded however large the
+# photo. Blur is judged at the proxy's resolution as is: natural images keep about
+# the same detail per pixel at any scale, and at 1024 pixels a blurry photo (or a
+# small one upscaled) still looks soft, which a smaller proxy would hide. Check the
+# agreement with full-resolution scores with ml/calibrate_quality.py
+PROXY_BLUR_VARIANCE = 500.0  # Laplacian variance that counts as fully sharp
+IDEAL_BRIGHTNESS = 127.0
+FULL_CONTRAST = 50.0  # Gray-level standard deviation that counts as full contrast
+
+# Relaxed thresholds for real-world mobile photos
+MIN_QUALITY_SCORE = 0.2
+MIN_BLUR_SCORE = 0.15
+
+
+def quality_metrics(proxies: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Laplacian variance, brightness and contrast of grayscale proxies
+
+    Each statistic is one cv2.meanStdDev pass (mean and standard deviation
+    together), and the Laplacian is kept in int16 - exact for 8-bit input
+    and a quarter of the memory of CV_64F.
+
+    Args:
+        proxies: N uint8 grayscale images (sizes may differ)
+
+    Returns:
+        Tuple of (N,) arrays: laplacian_variance, brightness, contrast
+    """
+    metrics = np.empty((len(proxies), 3))
+    for i, gray in enumerate(proxies):
+        _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+        mean, std = cv2.meanStdDev(gray)
+        metrics[i] = laplacian_std[0, 0] ** 2, mean[0, 0], std[0, 0]
+    return metrics[:, 0], metrics[:, 1], metrics[:, 2]
+
+
+def quality_scores(laplacian_var: np.ndarray, brightness: np.ndarray, contrast: np.ndarray,
+                   blur_variance: float = PROXY_BLUR_VARIANCE) -> Dict[str, np.ndarray]:
+    """
+    Score quality metrics for a whole batch at once (arrays from quality_metrics;
+    blur_variance is the Laplacian variance that counts as fully sharp)
+
+    Returns:
+        Dictionary of (N,) arrays: blur_score, brightness_score,
+        contrast_score, quality_score, laplacian_variance and is_valid
+    """
+    # Normalize blur score (higher is sharper)
+    blur_score = np.minimum(laplacian_var / blur_variance, 1.0)
+    # Ideal brightness is around 127 (middle gray)
+    brightness_score = 1.0 - np.abs(brightness - IDEAL_BRIGHTNESS) / IDEAL_BRIGHTNESS
+    # Normalize contrast (higher is better, typical range 0-100)
+    contrast_score = np.minimum(contrast / FULL_CONTRAST, 1.0)
+
+    # Calculate overall quality score (weighted average)
+    quality_score = (
+        blur_score * 0.5 +        # Blur is most important
+        brightness_score * 0.25 +  # Brightness matters
+        contrast_score * 0.25      # Contrast helps
+    )
+    return {
+        'blur_score': blur_score,
+        'brightness_score': brightness_score,
+        'contrast_score': contrast_score,
+        'quality_score': quality_score,
+        'laplacian_variance': laplacian_var,
+        'is_valid': (quality_score >= MIN_QUALITY_SCORE) & (blur_score >= MIN_BLUR_SCORE)
+    }
+
+
+def _check_dimensions(img: DecodedImage) -> Optional[Dict[str, any]]:
+    # Size of the file - large JPEGs are decoded at reduced scale
+    width, height = img.original_size
+    min_width, min_height = settings.MIN_IMAGE_SIZE
+    max_width, max_height = settings.MAX_IMAGE_SIZE
+
+    if width < min_width or height < min_height:
+        reason = f'Image too small (minimum {min_width}x{min_height} pixels)'
+    elif width > max_width or height > max_height:
+        reason = f'Image too large (maximum {max_width}x{max_height} pixels)'
+    else:
+        return None
+    return {
+        'is_valid': False,
+        'reason': reason,
+        'quality_score': 0.0,
+        'dimensions': (width, height)
+    }
+
+
+def _quality_result(img: DecodedImage, brightness: float, scores: Dict[str, float]) -> Dict[str, any]:
+    quality_score, blur_score = scores['quality_score'], scores['blur_score']
+    brightness_score, contrast_score = scores['brightness_score'], scores['contrast_score']
+    is_valid = bool(scores['is_valid'])
+
+    # Log quality metrics for debugging
+    print(f"DEBUG: Image quality check - Quality: {quality_score:.3f}, Blur: {blur_score:.3f}, "
+          f"Brightness: {brightness_score:.3f}, Contrast: {contrast_score:.3f}, "
+          f"Valid: {is_valid}")
+
+    result = {
+        'is_valid': is_valid,
+        'quality_score': round(quality_score, 3),
+        'blur_score': round(blur_score, 3),
+        'brightness_score': round(brightness_score, 3),
+        'contrast_score': round(contrast_score, 3),
+        'dimensions': img.original_size,
+        'brightness': round(brightness, 1),
+        'laplacian_variance': round(scores['laplacian_variance'], 1)
+    }
+
+    if not is_valid:
+        if blur_score < MIN_BLUR_SCORE:
+            result['reason'] = 'Image is too blurry. Please capture a clearer image.'
+        elif brightness_score < 0.3:
+            if brightness < 50:
+                result['reason'] = 'Image is too dark. Please use better lighting.'
+            else:
+                result['reason'] = 'Image is too bright. Please avoid direct sunlight.'
+        else:
+            result['reason'] = 'Image quality is too low. Please capture a better image.'
+
+    return result
+
+
+def check_image_quality_batch(images: List[Union[str, DecodedImage, None]]) -> List[Dict[str, any]]:
+    """
+    Check the quality of several images, scoring all of them in one vectorized pass
+
+    Args:
+        images: Paths to image files or already decoded images (None for
+                uploads that failed to decode)
+
+    Returns:
+        One check_image_quality result per image, in order
+    """
+    results = [None] * len(images)
+    scored = []
+    for i, image in enumerate(images):
+        try:
+            # Read image (no-op if the pipeline already decoded it)
+            img = load_image(image)
+            if img is None:
+                results[i] = {
+                    'is_valid': False,
+                    'reason': 'Unable to read image file',
+                    'quality_score': 0.0
+                }
+                continue
+            results[i] = _check_dimensions(img)
+            if results[i] is None:
+                scored.append((i, img))
+        except Exception as e:
+            results[i] = {
+                'is_valid': False,
+                'reason': f'Error processing image: {str(e)}',
+                'quality_score': 0.0
+            }
+
+    if scored:
+        laplacian_var, brightness, contrast = quality_metrics([img.quality_proxy for _, img in scored])
+        scores = quality_scores(laplacian_var, brightness, contrast)
+        for j, (i, img) in enumerate(scored):
+            results[i] = _quality_result(img, float(brightness[j]), {k: float(v[j]) for k, v in scores.items()})
+    return results
+
+
+def check_image_quality(image: Union[str, DecodedImage]) -> Dict[str, any]:
     """
     Check if image quality is acceptable for disease detection
     
     Args:
-        image_path: Path to the image file
+        image: Path to the image file or an already decoded image
         
     Returns:
         Dictionary with quality metrics and pass/fail status
     """
+    return check_image_quality_batch([image])[0]
+
+def check_content_validity(image: Union[str, DecodedImage]) -> Dict[str, any]:
+    """
+    Check that the image actually shows plant material before running the models
+    
+    Args:
+        image: Path to the image file or an already decoded image
+        
+    Returns:
+        Dictionary with leaf pixel ratio and pass/fail status
+    """
     try:
-        # Read image
-        img = cv2.imread(image_path)
+        img = load_image(image)
         
         if img is None:
             return {
                 'is_valid': False,
-                'reason': 'Unable to read image file',
-                'quality_score': 0.0
+                'reason': 'Unable to read image file'
             }
         
-        # Check image size
-        height, width = img.shape[:2]
+        # The 256x256 HSV view is shared with the severity estimator
+        hsv = img.hsv_256
+        leaf_mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+        for lower, upper in LEAF_HSV_RANGES:
+            leaf_mask |= cv2.inRange(hsv, lower, upper)
         
-        if width < 100 or height < 100:
-            return {
-                'is_valid': False,
-                'reason': 'Image too small (minimum 100x100 pixels)',
-                'quality_score': 0.0,
-                'dimensions': (width, height)
-            }
-        
-        if width > 4000 or height > 4000:
-            return {
-                'is_valid': False,
-                'reason': 'Image too large (maximum 4000x4000 pixels)',
-                'quality_score': 0.0,
-                'dimensions': (width, height)
-            }
-        
-        # Calculate blur score using Laplacian variance
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
-        # Normalize blur score (higher is sharper)
-        # Typical values: <100 = very blurry, 100-500 = acceptable, >500 = sharp
-        blur_score = min(laplacian_var / 500.0, 1.0)
-        
-        # Calculate brightness score
-        brightness = np.mean(gray)
-        # Ideal brightness is around 127 (middle gray)
-        brightness_score = 1.0 - abs(brightness - 127) / 127.0
-        
-        # Calculate contrast score
-        contrast = np.std(gray)
-        # Normalize contrast (higher is better, typical range 0-100)
-        contrast_score = min(contrast / 50.0, 1.0)
-        
-        # Calculate overall quality score (weighted average)
-        quality_score = (
-            blur_score * 0.5 +        # Blur is most important
-            brightness_score * 0.25 +  # Brightness matters
-            contrast_score * 0.25      # Contrast helps
-        )
-        
-        # Determine if image passes quality check
-        # Relaxed thresholds for real-world mobile photos
-        min_quality_threshold = 0.2
-        min_blur_threshold = 0.15
-        is_valid = quality_score >= min_quality_threshold and blur_score >= min_blur_threshold
-        
-        # Log quality metrics for debugging
-        print(f"DEBUG: Image quality check - Quality: {quality_score:.3f}, Blur: {blur_score:.3f}, "
-              f"Brightness: {brightness_score:.3f}, Contrast: {contrast_score:.3f}, "
-              f"Valid: {is_valid}")
+        leaf_ratio = np.count_nonzero(leaf_mask) / leaf_mask.size
+        is_valid = bool(leaf_ratio >= MIN_LEAF_PIXEL_RATIO)
         
         result = {
             'is_valid': is_valid,
-            'quality_score': round(quality_score, 3),
-            'blur_score': round(blur_score, 3),
-            'brightness_score': round(brightness_score, 3),
-            'contrast_score': round(contrast_score, 3),
-            'dimensions': (width, height),
-            'brightness': round(brightness, 1),
-            'laplacian_variance': round(laplacian_var, 1)
+            'leaf_ratio': round(float(leaf_ratio), 3)
         }
         
         if not is_valid:
-            if blur_score < min_blur_threshold:
-                result['reason'] = 'Image is too blurry. Please capture a clearer image.'
-            elif brightness_score < 0.3:
-                if brightness < 50:
-                    result['reason'] = 'Image is too dark. Please use better lighting.'
-                else:
-                    result['reason'] = 'Image is too bright. Please avoid direct sunlight.'
-            else:
-                result['reason'] = 'Image quality is too low. Please capture a better image.'
+            result['reason'] = 'No crop leaf detected. Please capture a close-up image of a leaf.'
         
         return result
         
     except Exception as e:
         return {
             'is_valid': False,
-            'reason': f'Error processing image: {str(e)}',
-            'quality_score': 0.0
+            'reason': f'Error processing image: {str(e)}'
         }
 
 def get_quality_feedback(quality_result: Dict) -> str:
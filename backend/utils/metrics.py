@@ -0,0 +1,54 @@
+import bisect
+import threading
+from typing import Dict, List
+
+
+class Histogram:
+    """
+    Small thread-safe fixed-bucket histogram for runtime statistics.
+
+    Buckets are upper bounds; values above the last bucket land in an
+    overflow bucket reported as "+Inf".
+    """
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def percentile(self, q: float) -> float:
+        """Approximate percentile (bucket upper bound), q in [0, 100]"""
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            target = self._count * q / 100.0
+            seen = 0
+            for i, count in enumerate(self._counts):
+                seen += count
+                if seen >= target and count:
+                    return self.buckets[i] if i < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> Dict:
+        labels = [str(b) for b in self.buckets] + ['+Inf']
+        with self._lock:
+            counts = dict(zip(labels, self._counts))
+            count, total, maximum = self._count, self._sum, self._max
+        return {
+            'count': count,
+            'mean': round(total / count, 3) if count else 0.0,
+            'max': round(maximum, 3),
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': counts
+        }
@@ -1,6 +1,9 @@
-import cv2
 import numpy as np
 
+from utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
 def preprocess_image(image_path: str, target_size: tuple = (224, 224)) -> np.ndarray:
     """
     Preprocess image for model prediction
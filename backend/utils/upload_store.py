@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from config.settings import settings
+from utils.decoded_image import CLASSIFIER_INPUT_SIZE, QUALITY_PROXY_SIZE, SEVERITY_INPUT_SIZE, DecodedImage
+from utils.image_header import check_image_header, read_image_header
+
+# Background writer for uploads that need to be kept (history rows)
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload-writer')
+
+# Leading bytes read from a spooled upload to find its header (JPEG
+# EXIF/ICC segments come first and are at most 64KB each)
+HEADER_SCAN_BYTES = 256 * 1024
+
+
+def check_upload_header(file) -> Dict[str, any]:
+    """
+    Run check_image_header on an uploaded werkzeug FileStorage without
+    decoding it; in-memory uploads are read through a zero-copy view
+    """
+    stream = file.stream
+    stream.seek(0)
+    if hasattr(stream, 'getbuffer'):
+        with stream.getbuffer() as view:
+            return check_image_header(view)
+
+    head = stream.read(HEADER_SCAN_BYTES)
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    if len(head) < size and read_image_header(head) is None:
+        head = stream.read()  # Header segments larger than usual
+        stream.seek(0)
+    return check_image_header(head, size)
+
+
+def decode_min_side() -> Optional[int]:
+    """
+    Smallest image side the pipeline needs: the largest model input (the
+    classifiers center-crop to it), the severity resize, the quality proxy
+    (blur is judged at its resolution) or, with tiled inference, the side
+    tiles are cut from, whichever is bigger. None when REDUCED_DECODE is off
+    (always decode at full size)
+    """
+    if not settings.REDUCED_DECODE:
+        return None
+    model_sizes = [spec['input_size'] for spec in settings.MODEL_MANIFEST]
+    if settings.TILED_INFERENCE:
+        model_sizes.append(settings.TILED_INFERENCE_SIDE)
+    return max([CLASSIFIER_INPUT_SIZE, SEVERITY_INPUT_SIZE, QUALITY_PROXY_SIZE] + model_sizes)
+
+
+def decode_upload(file) -> Optional[DecodedImage]:
+    """
+    Decode an uploaded werkzeug FileStorage straight from its stream.
+
+    Small uploads live in an in-memory buffer, which is decoded through a
+    zero-copy view; larger ones spooled to a temp file are read once.
+    Large JPEGs are decoded at reduced scale (see decode_min_side).
+    Nothing is written to the upload folder.
+    """
+    stream = file.stream
+    stream.seek(0)
+    if hasattr(stream, 'getbuffer'):
+        with stream.getbuffer() as view:
+            return DecodedImage.from_bytes(view, source=file.filename, min_side=decode_min_side())
+    return DecodedImage.from_bytes(stream.read(), source=file.filename, min_side=decode_min_side())
+
+
+def _write_file(data: bytes, filepath: str) -> str:
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    return filepath
+
+
+def persist_upload_async(file, filepath: str) -> Future:
+    """
+    Save the original upload to disk in the background.
+
+    The bytes are copied out of the request stream before returning, since
+    werkzeug closes it when the request ends.
+    """
+    file.stream.seek(0)
+    return persist_bytes_async(file.stream.read(), filepath)
+
+
+def persist_bytes_async(data: bytes, filepath: str) -> Future:
+    """Save already-read image bytes to disk in the background"""
+    future = _writer.submit(_write_file, data, filepath)
+    future.add_done_callback(_report_write_error)
+    return future
+
+
+def _report_write_error(future: Future):
+    if future.exception() is not None:
+        print(f"DEBUG: Failed to save upload: {future.exception()}")
@@ -125,6 +125,18 @@ class Database:
                 )
             ''')
             
+            # Translation cache (shared by all worker processes)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS translations (
+                    source_text TEXT NOT NULL,
+                    source_language TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (source_text, source_language, target_language)
+                )
+            ''')
+            
             conn.commit()
     
     @contextmanager